@@ -1,12 +1,51 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from src.data_manager import DataManager
-
-app = FastAPI(title="Journal API", description="REST API для школьного дневника")
+import asyncio
+import csv
+import io
+import json
+import os
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Annotated, Literal, Union
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Path, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from src.storage import Storage, BatchError, MAX_LESSONS, MUTATION_RESOURCES
+from src.sqlite_data_manager import SqliteStorage
+from src.async_data_manager import AsyncDataManager, EVENT_RESOURCES
+from src.journals import JournalRegistry
 
 DAYS_OF_WEEK = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
 
-dm = DataManager()
+# JOURNAL_DB=data/journal.db переключает API на SQLite (см. python -m src.sqlite_data_manager)
+# JOURNAL_LOG=1 — режим журнала (правки оценок и ДЗ дописываются в data/mutations.log); каталог data/
+# тогда не делится ни с GUI, ни с другими воркерами
+dm = (SqliteStorage(os.environ['JOURNAL_DB']) if os.environ.get('JOURNAL_DB')
+      else Storage(journal_mode=os.environ.get('JOURNAL_LOG') == '1'))
+storage = AsyncDataManager(dm)
+# Журналы школы: те же маршруты под /journals/{id}/..., данные в JOURNALS_DIR/<id>/
+journals = JournalRegistry(os.environ.get('JOURNALS_DIR', 'journals'),
+                           capacity=int(os.environ.get('JOURNALS_OPEN', 64)))
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await storage.close()
+    await journals.close()
+
+app = FastAPI(title="Journal API", description="REST API для школьного дневника", lifespan=lifespan)
+router = APIRouter()
+
+async def get_journal(request: Request):
+    # Без префикса /journals/{journal_id} — журнал из data/ (или JOURNAL_DB), как раньше
+    journal_id = request.path_params.get("journal_id")
+    if journal_id is None:
+        return storage
+    try:
+        return await journals.get(journal_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Журнал не найден")
 
 class SubjectsPayload(BaseModel):
     subjects: list[str]
@@ -20,112 +59,458 @@ class HomeworkDayPayload(BaseModel):
 class GradesPayload(BaseModel):
     grades: list    # [5, 4, 3, ...]
 
+class GradeCellPayload(BaseModel):
+    value: str      # "5", "Н" или "" чтобы очистить
+
+class HomeworkCellPayload(BaseModel):
+    text: str
+
+class ScheduleCellPayload(BaseModel):
+    subject: str
+
+# Операции пакета POST /batch; поля идут в том же порядке, что аргументы мутаций Storage
+
+Day = Literal[tuple(DAYS_OF_WEEK)]
+
+class SetSubjectsOp(BaseModel):
+    op: Literal['set_subjects']
+    subjects: list[str]
+
+class AddSubjectOp(BaseModel):
+    op: Literal['add_subject']
+    name: str = Field(min_length=1)
+
+class RemoveSubjectOp(BaseModel):
+    op: Literal['remove_subject']
+    name: str
+
+class SetHomeworkOp(BaseModel):
+    op: Literal['set_homework']
+    date: str
+    subject: str
+    text: str
+
+class SetHomeworkDayOp(BaseModel):
+    op: Literal['set_homework_day']
+    date: str
+    homework: dict[str, str]
+
+class DeleteHomeworkDayOp(BaseModel):
+    op: Literal['delete_homework_day']
+    date: str
+
+class SetGradeOp(BaseModel):
+    op: Literal['set_grade']
+    subject: str
+    term: int = Field(ge=0, lt=4)
+    index: int = Field(ge=0, lt=100)
+    value: str
+
+class SetSubjectGradesOp(BaseModel):
+    op: Literal['set_subject_grades']
+    subject: str
+    grades: list
+
+class DeleteSubjectGradesOp(BaseModel):
+    op: Literal['delete_subject_grades']
+    subject: str
+
+class SetScheduleCellOp(BaseModel):
+    op: Literal['set_schedule_cell']
+    day: Day
+    start_date: date
+    lesson: int = Field(ge=0, lt=MAX_LESSONS)
+    subject: str
+
+class SetScheduleOp(BaseModel):
+    op: Literal['set_schedule']
+    schedule: dict
+
+BatchOp = Annotated[Union[SetSubjectsOp, AddSubjectOp, RemoveSubjectOp, SetHomeworkOp, SetHomeworkDayOp,
+                          DeleteHomeworkDayOp, SetGradeOp, SetSubjectGradesOp, DeleteSubjectGradesOp,
+                          SetScheduleCellOp, SetScheduleOp], Field(discriminator='op')]
+
+class BatchPayload(BaseModel):
+    operations: list[BatchOp] = Field(min_length=1, max_length=1000)
+
+# Условные запросы: ETag — хэш содержимого ресурса из Storage.resource_version
+
+def _etag(dm, resource):
+    return f'"{dm.resource_version(resource)}"'
+
+def _etag_matches(header, tag):
+    # If-None-Match: слабое сравнение, W/"…" совпадает с "…"
+    return header is not None and any(item.strip() in ('*', tag, f'W/{tag}') for item in header.split(','))
+
+def _etag_matches_strong(header, tag):
+    # If-Match: только сильное сравнение (RFC 7232), слабые теги не совпадают ни с чем
+    return any(item.strip() in ('*', tag) for item in header.split(','))
+
+async def _get(journal, request, resource, key, build):
+    # build(dm) выполняется в потоке; готовый JSON кэшируется, пока не сменится версия ресурса
+    version = await journal.version(resource)
+    tag = f'"{version}"'
+    if _etag_matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    body = await journal.render(resource, key, version, build)
+    return Response(content=body, media_type="application/json", headers={"ETag": tag})
+
+def _check_if_match(dm, request, resource):
+    # Вызывается внутри транзакции journal.run, чтобы проверка и запись были атомарны
+    header = request.headers.get("if-match")
+    if header is not None and not _etag_matches_strong(header, _etag(dm, resource)):
+        raise HTTPException(status_code=412, detail="Ресурс изменился, получите актуальную версию")
+
+async def _mutate(journal, request, response, resource, apply):
+    def run(dm):
+        _check_if_match(dm, request, resource)
+        result = apply(dm)
+        return result, _etag(dm, resource)
+    result, tag = await journal.run([resource], run)
+    response.headers["ETag"] = tag
+    return result
+
 # Список предметов
 
-@app.get("/subjects", summary="Получить список предметов")
-def get_subjects():
-    return {"subjects": dm.load_subjects()}
+@router.get("/subjects", summary="Получить список предметов")
+async def get_subjects(request: Request, journal: AsyncDataManager = Depends(get_journal)):
+    return await _get(journal, request, 'subjects', ('subjects',), lambda dm: {"subjects": dm.load_subjects()})
 
-@app.put("/subjects", summary="Обновить список предметов целиком")
-def update_subjects(payload: SubjectsPayload):
-    dm.save_subjects(payload.subjects)
+@router.put("/subjects", summary="Обновить список предметов целиком")
+async def update_subjects(payload: SubjectsPayload, request: Request, response: Response,
+                          journal: AsyncDataManager = Depends(get_journal)):
+    await _mutate(journal, request, response, 'subjects', lambda dm: dm.save_subjects(payload.subjects))
     return {"ok": True, "subjects": payload.subjects}
 
-@app.post("/subjects", summary="Добавить предмет")
-def add_subject(payload: dict):
+@router.post("/subjects", summary="Добавить предмет")
+async def add_subject(payload: dict, request: Request, response: Response,
+                      journal: AsyncDataManager = Depends(get_journal)):
     name = payload.get("name", "").strip()
     if not name:
         raise HTTPException(status_code=422, detail="Поле 'name' обязательно")
-    subjects = dm.load_subjects()
-    if name in subjects:
-        raise HTTPException(status_code=409, detail="Предмет уже существует")
-    subjects.append(name)
-    dm.save_subjects(subjects)
+    def apply(dm):
+        subjects = dm.load_subjects()
+        if name in subjects:
+            raise HTTPException(status_code=409, detail="Предмет уже существует")
+        subjects.append(name)
+        dm.save_subjects(subjects)
+        return subjects
+    subjects = await _mutate(journal, request, response, 'subjects', apply)
     return {"ok": True, "subjects": subjects}
 
-@app.delete("/subjects/{name}", summary="Удалить предмет")
-def delete_subject(name: str):
-    subjects = dm.load_subjects()
-    if name not in subjects:
-        raise HTTPException(status_code=404, detail="Предмет не найден")
-    subjects.remove(name)
-    dm.save_subjects(subjects)
+@router.delete("/subjects/{name}", summary="Удалить предмет")
+async def delete_subject(name: str, request: Request, response: Response,
+                         journal: AsyncDataManager = Depends(get_journal)):
+    def apply(dm):
+        subjects = dm.load_subjects()
+        if name not in subjects:
+            raise HTTPException(status_code=404, detail="Предмет не найден")
+        subjects.remove(name)
+        dm.save_subjects(subjects)
+        return subjects
+    subjects = await _mutate(journal, request, response, 'subjects', apply)
     return {"ok": True, "subjects": subjects}
 
 # Домашние задания
 
-@app.get("/homework", summary="Получить все домашние задания")
-def get_homework():
-    return {"homework": dm.load_homework()}
-
-@app.get("/homework/{date}", summary="Получить домашнее задание на дату (формат: YYYY-MM-DD)")
-def get_homework_by_date(date: str):
-    homework = dm.load_homework()
-    if date not in homework:
-        raise HTTPException(status_code=404, detail=f"Нет домашнего задания на {date}")
-    return {"date": date, "homework": homework[date]}
-
-@app.put("/homework/{date}", summary="Обновить домашнее задание на дату")
-def update_homework_by_date(date: str, payload: HomeworkDayPayload):
-    homework = dm.load_homework()
-    homework[date] = payload.homework
-    dm.save_homework(homework)
+def _stream_homework(dm, start, end, subject, limit, cursor):
+    # Ответ собирается по дням; next_cursor — последняя выданная дата, если за ней есть ещё дни
+    yield '{"homework":{'
+    count = 0
+    last = None
+    chunk = []
+    for day, entries in dm.iter_homework(start, end, subject, cursor):
+        if limit is not None and count == limit:
+            chunk.append('},"next_cursor":' + json.dumps(last, ensure_ascii=False) + '}')
+            yield ''.join(chunk)
+            return
+        chunk.append(('' if count == 0 else ',') + json.dumps(day, ensure_ascii=False) + ':'
+                     + json.dumps(entries, ensure_ascii=False, separators=(',', ':')))
+        count += 1
+        last = day
+        if len(chunk) >= 64:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append('},"next_cursor":null}')
+    yield ''.join(chunk)
+
+@router.get("/homework", summary="Получить домашние задания (все или за период, с постраничной выдачей)")
+async def get_homework(request: Request,
+                       date_from: date | None = Query(None, alias="from"),
+                       date_to: date | None = Query(None, alias="to"),
+                       subject: str | None = None,
+                       limit: int | None = Query(None, ge=1, le=1000),
+                       cursor: str | None = None, journal: AsyncDataManager = Depends(get_journal)):
+    if date_from is None and date_to is None and subject is None and limit is None and cursor is None:
+        return await _get(journal, request, 'homework', ('homework',), lambda dm: {"homework": dm.load_homework()})
+    if date_from and date_to and date_to < date_from:
+        raise HTTPException(status_code=422, detail="Неверный диапазон дат")
+    tag = f'"{await journal.version("homework")}"'
+    if _etag_matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    start = date_from.isoformat() if date_from else None
+    end = date_to.isoformat() if date_to else None
+    return StreamingResponse(_stream_homework(journal.dm, start, end, subject, limit, cursor),
+                             media_type="application/json", headers={"ETag": tag})
+
+# Объявлен до /homework/{date}, иначе "search" попал бы в дату
+@router.get("/homework/search", summary="Поиск по тексту домашних заданий (все слова запроса, без учёта формы слова)")
+async def search_homework(q: str = Query(min_length=1, max_length=200), limit: int = Query(50, ge=1, le=200),
+                          journal: AsyncDataManager = Depends(get_journal)):
+    return {"query": q, "results": await journal.search_homework(q, limit)}
+
+@router.get("/homework/{date}", summary="Получить домашнее задание на дату (формат: YYYY-MM-DD)")
+async def get_homework_by_date(date: str, request: Request, journal: AsyncDataManager = Depends(get_journal)):
+    def build(dm):
+        homework = dm.load_homework_day(date)
+        if homework is None:
+            raise HTTPException(status_code=404, detail=f"Нет домашнего задания на {date}")
+        return {"date": date, "homework": homework}
+    return await _get(journal, request, 'homework', ('homework', date), build)
+
+@router.put("/homework/{date}", summary="Обновить домашнее задание на дату")
+async def update_homework_by_date(date: str, payload: HomeworkDayPayload, request: Request, response: Response,
+                                  journal: AsyncDataManager = Depends(get_journal)):
+    await _mutate(journal, request, response, 'homework', lambda dm: dm.save_homework_day(date, payload.homework))
     return {"ok": True, "date": date, "homework": payload.homework}
 
-@app.delete("/homework/{date}", summary="Удалить домашнее задание на дату")
-def delete_homework_by_date(date: str):
-    homework = dm.load_homework()
-    if date not in homework:
-        raise HTTPException(status_code=404, detail=f"Нет домашнего задания на {date}")
-    del homework[date]
-    dm.save_homework(homework)
+@router.patch("/homework/{date}/{subject}", summary="Изменить задание по одному предмету на дату")
+async def patch_homework(date: str, subject: str, payload: HomeworkCellPayload, request: Request, response: Response,
+                         journal: AsyncDataManager = Depends(get_journal)):
+    await _mutate(journal, request, response, 'homework', lambda dm: dm.set_homework(date, subject, payload.text))
+    return {"ok": True, "date": date, "subject": subject, "text": payload.text}
+
+@router.delete("/homework/{date}", summary="Удалить домашнее задание на дату")
+async def delete_homework_by_date(date: str, request: Request, response: Response,
+                                  journal: AsyncDataManager = Depends(get_journal)):
+    def apply(dm):
+        if not dm.delete_homework_day(date):
+            raise HTTPException(status_code=404, detail=f"Нет домашнего задания на {date}")
+    await _mutate(journal, request, response, 'homework', apply)
     return {"ok": True}
 
 # Оценки
 
-@app.get("/grades", summary="Получить все оценки")
-def get_grades():
-    return {"grades": dm.load_grades()}
-
-@app.get("/grades/{subject}", summary="Получить оценки по предмету")
-def get_grades_by_subject(subject: str):
-    grades = dm.load_grades()
-    if subject not in grades:
-        raise HTTPException(status_code=404, detail="Предмет не найден")
-    return {"subject": subject, "grades": grades[subject]}
-
-@app.put("/grades/{subject}", summary="Обновить оценки по предмету")
-def update_grades_by_subject(subject: str, payload: GradesPayload):
-    grades = dm.load_grades()
-    grades[subject] = payload.grades
-    dm.save_grades(grades)
+@router.get("/grades", summary="Получить все оценки")
+async def get_grades(request: Request, journal: AsyncDataManager = Depends(get_journal)):
+    return await _get(journal, request, 'grades', ('grades',), lambda dm: {"grades": dm.load_grades()})
+
+@router.get("/grades/stats", summary="Средние по четвертям, распределение отметок, пропуски и итоговые оценки")
+async def get_grades_stats(request: Request, journal: AsyncDataManager = Depends(get_journal)):
+    def build(dm):
+        # NumPy нужен только здесь, поэтому не грузится при старте воркера
+        from src.grade_stats import GradeStats
+        return {"stats": GradeStats(dm.load_grades()).to_dict()}
+    return await _get(journal, request, 'grades', ('grades', 'stats'), build)
+
+@router.get("/grades/{subject}", summary="Получить оценки по предмету")
+async def get_grades_by_subject(subject: str, request: Request,
+                                journal: AsyncDataManager = Depends(get_journal)):
+    def build(dm):
+        grades = dm.load_grades()
+        if subject not in grades:
+            raise HTTPException(status_code=404, detail="Предмет не найден")
+        return {"subject": subject, "grades": grades[subject]}
+    return await _get(journal, request, 'grades', ('grades', subject), build)
+
+@router.put("/grades/{subject}", summary="Обновить оценки по предмету")
+async def update_grades_by_subject(subject: str, payload: GradesPayload, request: Request, response: Response,
+                                   journal: AsyncDataManager = Depends(get_journal)):
+    def apply(dm):
+        grades = dm.load_grades()
+        grades[subject] = payload.grades
+        dm.save_grades(grades)
+    await _mutate(journal, request, response, 'grades', apply)
     return {"ok": True, "subject": subject, "grades": payload.grades}
 
-@app.delete("/grades/{subject}", summary="Удалить оценки по предмету")
-def delete_grades_by_subject(subject: str):
-    grades = dm.load_grades()
-    if subject not in grades:
-        raise HTTPException(status_code=404, detail="Предмет не найден")
-    del grades[subject]
-    dm.save_grades(grades)
+@router.patch("/grades/{subject}/{term}/{index}", summary="Изменить одну оценку (четверть и номер с 0)")
+async def patch_grade(subject: str, payload: GradeCellPayload, request: Request, response: Response,
+                      term: int = Path(ge=0, lt=4), index: int = Path(ge=0, lt=100),
+                      journal: AsyncDataManager = Depends(get_journal)):
+    await _mutate(journal, request, response, 'grades', lambda dm: dm.set_grade(subject, term, index, payload.value))
+    return {"ok": True, "subject": subject, "term": term, "index": index, "value": payload.value}
+
+@router.delete("/grades/{subject}", summary="Удалить оценки по предмету")
+async def delete_grades_by_subject(subject: str, request: Request, response: Response,
+                                   journal: AsyncDataManager = Depends(get_journal)):
+    def apply(dm):
+        grades = dm.load_grades()
+        if subject not in grades:
+            raise HTTPException(status_code=404, detail="Предмет не найден")
+        del grades[subject]
+        dm.save_grades(grades)
+    await _mutate(journal, request, response, 'grades', apply)
     return {"ok": True}
 
 # Расписание
 
-@app.get("/schedule", summary="Получить расписание на всю неделю")
-def get_schedule():
-    return {"schedule": dm.load_schedule()}
+@router.get("/schedule", summary="Получить расписание на всю неделю")
+async def get_schedule(request: Request, journal: AsyncDataManager = Depends(get_journal)):
+    return await _get(journal, request, 'schedule', ('schedule',), lambda dm: {"schedule": dm.load_schedule()})
+
+@router.get("/schedule/range", summary="Получить предметы на каждую дату отрезка (не больше года)")
+async def get_schedule_range(request: Request, date_from: date = Query(alias="from"),
+                             date_to: date = Query(alias="to"),
+                             journal: AsyncDataManager = Depends(get_journal)):
+    if date_to < date_from or (date_to - date_from).days > 366:
+        raise HTTPException(status_code=422, detail="Неверный диапазон дат")
+    def build(dm):
+        resolved = dm.schedule_timeline().resolve_range(date_from, date_to)
+        return {"schedule": {day: {"day": DAYS_OF_WEEK[date.fromisoformat(day).weekday()], "subjects": subjects}
+                             for day, subjects in resolved.items()}}
+    return await _get(journal, request, 'schedule', ('schedule', 'range', date_from, date_to), build)
 
-@app.get("/schedule/{day}", summary="Получить расписание на день")
-def get_schedule_by_day(day: str):
+@router.get("/schedule/{day}", summary="Получить расписание на день")
+async def get_schedule_by_day(day: str, request: Request, journal: AsyncDataManager = Depends(get_journal)):
     if day not in DAYS_OF_WEEK:
         raise HTTPException(status_code=422, detail=f"Неверный день. Доступны: {DAYS_OF_WEEK}")
-    schedule = dm.load_schedule()
-    if day not in schedule:
-        raise HTTPException(status_code=404, detail="Расписание для этого дня не найдено")
-    return {"day": day, "schedule": schedule[day]}
-
-@app.put("/schedule", summary="Обновить расписание целиком")
-def update_schedule(payload: SchedulePayload):
-    dm.save_schedule(payload.schedule)
-    return {"ok": True}
\ No newline at end of file
+    def build(dm):
+        schedule = dm.load_schedule()
+        if day not in schedule:
+            raise HTTPException(status_code=404, detail="Расписание для этого дня не найдено")
+        return {"day": day, "schedule": schedule[day]}
+    return await _get(journal, request, 'schedule', ('schedule', day), build)
+
+@router.patch("/schedule/{day}/{start_date}/{lesson}", summary="Изменить один урок в версии расписания дня (урок с 0)")
+async def patch_schedule(day: str, start_date: date, payload: ScheduleCellPayload, request: Request,
+                         response: Response, lesson: int = Path(ge=0, lt=MAX_LESSONS),
+                         journal: AsyncDataManager = Depends(get_journal)):
+    if day not in DAYS_OF_WEEK:
+        raise HTTPException(status_code=422, detail=f"Неверный день. Доступны: {DAYS_OF_WEEK}")
+    start = start_date.isoformat()
+    await _mutate(journal, request, response, 'schedule', lambda dm: dm.set_schedule_cell(day, start, lesson, payload.subject))
+    return {"ok": True, "day": day, "start_date": start, "lesson": lesson, "subject": payload.subject}
+
+@router.put("/schedule", summary="Обновить расписание целиком")
+async def update_schedule(payload: SchedulePayload, request: Request, response: Response,
+                          journal: AsyncDataManager = Depends(get_journal)):
+    await _mutate(journal, request, response, 'schedule', lambda dm: dm.save_schedule(payload.schedule))
+    return {"ok": True}
+
+# Пакет операций
+
+@router.post("/batch", summary="Применить список операций целиком или не применить ни одной")
+async def batch(payload: BatchPayload, response: Response, journal: AsyncDataManager = Depends(get_journal)):
+    operations = [(item.op, tuple(item.model_dump(mode='json', exclude={'op'}).values()))
+                  for item in payload.operations]
+    resources = sorted({MUTATION_RESOURCES[op] for op, _ in operations})
+    def apply(dm):
+        dm.apply_batch(operations)
+        return {resource: _etag(dm, resource) for resource in resources}
+    try:
+        versions = await journal.run(resources, apply)
+    except BatchError as e:
+        raise HTTPException(status_code=409, detail={"index": e.index, "op": e.op, "error": str(e)})
+    return {"ok": True,
+            "results": [{"index": index, "op": op, "ok": True} for index, (op, _) in enumerate(operations)],
+            "versions": versions}
+
+# Выгрузка для отчётов: по записи на строку, без сборки всего ресурса в памяти
+
+EXPORT_FIELDS = {
+    'grades': ('subject', 'term', 'index', 'value'),
+    'homework': ('date', 'subject', 'text'),
+}
+
+def _stream_export(dm, resource, export_format):
+    fields = EXPORT_FIELDS[resource]
+    records = dm.iter_grade_records() if resource == 'grades' else dm.iter_homework_records()
+    buffer = io.StringIO()
+    if export_format == 'csv':
+        # BOM, чтобы Excel открыл кириллицу без выбора кодировки
+        buffer.write('\ufeff')
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        write = writer.writerow
+    else:
+        write = lambda record: buffer.write(json.dumps(dict(zip(fields, record)), ensure_ascii=False) + '\n')
+    for record in records:
+        write(record)
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@router.get("/export", summary="Выгрузить оценки или домашние задания построчно (NDJSON или CSV)")
+async def export(resource: Literal['grades', 'homework'],
+                 export_format: Literal['ndjson', 'csv'] = Query('ndjson', alias="format"),
+                 journal: AsyncDataManager = Depends(get_journal)):
+    media_type = "text/csv; charset=utf-8" if export_format == 'csv' else "application/x-ndjson"
+    filename = f"{resource}.{export_format}"
+    return StreamingResponse(_stream_export(journal.dm, resource, export_format), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# Уведомления об изменениях (Server-Sent Events)
+
+def _event_id(versions):
+    # id события — версии (ETag) всех ресурсов потока: по Last-Event-ID после переподключения
+    # видно, какие из них изменились, пока клиента не было
+    return ','.join(f'{resource}={version}' for resource, version in sorted(versions.items()))
+
+def _parse_event_id(header):
+    versions = {}
+    for item in (header or '').split(','):
+        resource, _, version = item.strip().partition('=')
+        if version:
+            versions[resource] = version
+    return versions
+
+def _sse(kind, event, versions):
+    return f"id: {_event_id(versions)}\nevent: {kind}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+async def _stream_events(journal, request, resources):
+    queue = journal.subscribe()
+    try:
+        # Версии берутся после подписки: изменение между ними придёт событием, а не потеряется
+        versions = await journal.versions(resources)
+        # Первым идёт комментарий, чтобы клиент сразу получил заголовки и знал, что подписка есть
+        yield ": subscribed\n\n"
+        last = _parse_event_id(request.headers.get("last-event-id"))
+        if last:
+            for resource in sorted(resources):
+                if last.get(resource) != versions[resource]:
+                    yield _sse("change", {"resource": resource, "keys": [], "version": versions[resource]}, versions)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=15)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": ping\n\n"
+                continue
+            if event["resource"] != "*" and event["resource"] not in resources:
+                continue
+            if event.get("reset"):
+                versions = await journal.versions(resources)
+                yield _sse("reset", event, versions)
+            else:
+                versions[event["resource"]] = event["version"]
+                yield _sse("change", event, versions)
+    finally:
+        journal.unsubscribe(queue)
+
+@router.get("/events", summary="Поток уведомлений об изменениях (SSE): ресурс, изменённые ключи, версия (ETag). "
+            "Записи других процессов приходят с задержкой до секунды и без ключей; "
+            "после переподключения с Last-Event-ID приходят ресурсы, изменившиеся за это время")
+async def events(request: Request, resource: str | None = Query(None, description="Через запятую: grades,homework"),
+                 journal: AsyncDataManager = Depends(get_journal)):
+    resources = set(resource.split(',')) if resource else set(EVENT_RESOURCES)
+    if not resources <= set(EVENT_RESOURCES):
+        raise HTTPException(status_code=422, detail=f"Неверный ресурс. Доступны: {list(EVENT_RESOURCES)}")
+    return StreamingResponse(_stream_events(journal, request, resources), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Журналы школы
+
+@app.put("/journals/{journal_id}", summary="Создать журнал (если его ещё нет)")
+async def create_journal(journal_id: str, response: Response):
+    try:
+        created = journals.create(journal_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    response.status_code = 201 if created else 200
+    return {"ok": True, "journal": journal_id, "created": created}
+
+app.include_router(router)
+app.include_router(router, prefix="/journals/{journal_id}")
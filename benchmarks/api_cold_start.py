@@ -0,0 +1,48 @@
+"""Холодный старт воркера api.py: время импорта и пиковая память после первого запроса.
+
+    python benchmarks/api_cold_start.py --runs 7
+
+Каждый замер — отдельный процесс, чтобы кэш импортов не переживал между запусками.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, resource, sys, time
+started = time.perf_counter()
+import api
+imported = time.perf_counter() - started
+from fastapi.testclient import TestClient
+TestClient(api.app).get("/grades")
+print(json.dumps({
+    "import": imported,
+    "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "qt": "PyQt5.QtCore" in sys.modules,
+}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, capture_output=True, text=True,
+                                check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    print(f"import api: {statistics.median(r['import'] for r in runs) * 1000:6.0f} ms  "
+          f"max RSS: {statistics.median(r['rss'] for r in runs):5.1f} MB  "
+          f"PyQt5 загружен: {'да' if runs[0]['qt'] else 'нет'}")
+
+
+if __name__ == '__main__':
+    main()
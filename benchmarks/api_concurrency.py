@@ -0,0 +1,150 @@
+"""Сравнение async-обработчиков api.py с прежними синхронными под 100+ одновременными клиентами.
+
+    python benchmarks/api_concurrency.py --clients 128 --requests 50
+
+Оба приложения запускаются через uvicorn в отдельных процессах на копии data/ во временном каталоге.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.storage import Storage  # noqa: E402
+
+# Прежний вариант: обычные def-обработчики в пуле потоков над общим хранилищем
+sync_app = FastAPI()
+sync_dm = Storage()
+
+
+class GradesPayload(BaseModel):
+    grades: list
+
+
+@sync_app.get("/subjects")
+def sync_subjects():
+    return {"subjects": sync_dm.load_subjects()}
+
+
+@sync_app.get("/grades")
+def sync_grades():
+    return {"grades": sync_dm.load_grades()}
+
+
+@sync_app.get("/homework")
+def sync_homework():
+    return {"homework": sync_dm.load_homework()}
+
+
+@sync_app.get("/schedule")
+def sync_schedule():
+    return {"schedule": sync_dm.load_schedule()}
+
+
+@sync_app.put("/grades/{subject}")
+def sync_update_grades(subject: str, payload: GradesPayload):
+    with sync_dm.transaction('grades'):
+        grades = sync_dm.load_grades()
+        grades[subject] = payload.grades
+        sync_dm.save_grades(grades)
+    return {"ok": True}
+
+
+READ_PATHS = ['/subjects', '/grades', '/homework', '/schedule']
+
+
+async def _client(client, requests, latencies, subjects):
+    for _ in range(requests):
+        started = time.perf_counter()
+        if random.random() < 0.1:
+            grades = [[random.choice('2345') for _ in range(20)], [], [], []]
+            response = await client.put(f'/grades/{random.choice(subjects)}', json={'grades': grades})
+        else:
+            response = await client.get(random.choice(READ_PATHS))
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+
+async def _load(base_url, clients, requests):
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        subjects = (await client.get('/subjects')).json()['subjects']
+        latencies = []
+        started = time.perf_counter()
+        await asyncio.gather(*(_client(client, requests, latencies, subjects) for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def _seed(workdir):
+    # Объём данных примерно как у журнала за два года
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        dm = Storage()
+        subjects = dm.load_subjects()
+        dm.save_grades({subject: [[random.choice(['', '2', '3', '4', '5', 'Н']) for _ in range(45)]
+                                  for _ in range(4)] for subject in subjects})
+        start = time.mktime((2024, 9, 1, 12, 0, 0, 0, 0, -1))
+        dm.save_homework({time.strftime('%Y-%m-%d', time.localtime(start + day * 86400)):
+                          {subject: f'стр. {day}, упр. {day % 17}' for subject in random.sample(subjects, 6)}
+                          for day in range(730)})
+    finally:
+        os.chdir(previous)
+
+
+def _serve(app_path, port, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', app_path, '--port', str(port), '--log-level', 'warning', '--timeout-keep-alive', '120'],
+        cwd=workdir, env=env)
+    for _ in range(100):
+        try:
+            httpx.get(f'http://127.0.0.1:{port}/subjects')
+            return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{app_path} не запустился')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=128)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    for name, app_path in (('sync def', 'benchmarks.api_concurrency:sync_app'), ('async def', 'api:app')):
+        workdir = tempfile.mkdtemp()
+        shutil.copytree(os.path.join(ROOT, 'data'), os.path.join(workdir, 'data'))
+        _seed(workdir)
+        process = _serve(app_path, args.port, workdir)
+        try:
+            result = asyncio.run(_load(f'http://127.0.0.1:{args.port}', args.clients, args.requests))
+        finally:
+            process.terminate()
+            process.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(f"{name:>10}: {result['rps']:8.0f} req/s  p50 {result['p50']:7.1f} ms  p99 {result['p99']:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
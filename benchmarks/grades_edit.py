@@ -0,0 +1,59 @@
+"""Задержка одной правки оценки в GradesModel при разном числе предметов и заполненных клеток.
+
+    python benchmarks/grades_edit.py --edits 2000
+
+Запись на диск отложена (write_delay), поэтому меряется именно путь правки в модели:
+set_grade, пересчёт среднего, счётчик заполненности и уведомление dataChanged.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.data_manager import DataManager  # noqa: E402
+from src.grade_stats import GradeStats, TERM_DAYS  # noqa: E402
+from src.grades_tab import GradesModel  # noqa: E402
+
+
+def measure(subjects, slots, edits):
+    with tempfile.TemporaryDirectory() as root:
+        dm = DataManager(root=root, write_delay=3600)
+        names = [f"Предмет {i}" for i in range(subjects)]
+        grades = {name: [[random.choice('2345') for _ in range(slots)], [], [], []] for name in names}
+        dm.save_subjects(names)
+        dm.save_grades(grades)
+        grades = dm.load_grades()
+        model = GradesModel(dm, grades, GradeStats(grades), list(TERM_DAYS))
+        model.reset(subjects=names)
+        times = []
+        for _ in range(edits):
+            index = model.index(random.randrange(subjects), random.randrange(1, slots + 1))
+            value = random.choice(['', '2', '3', '4', '5', 'Н'])
+            started = time.perf_counter()
+            model.setData(index, value)
+            times.append(time.perf_counter() - started)
+        dm.flush()
+        return statistics.median(times), sorted(times)[int(len(times) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--edits', type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    for subjects in (10, 100, 1000):
+        for slots in (5, 20, 50):
+            median, p99 = measure(subjects, slots, args.edits)
+            print(f"предметов {subjects:5d}  клеток {slots:3d}: "
+                  f"медиана {median * 1e6:7.1f} µs  p99 {p99 * 1e6:7.1f} µs")
+
+
+if __name__ == '__main__':
+    main()
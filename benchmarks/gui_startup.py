@@ -0,0 +1,55 @@
+"""Время до первой отрисовки главного окна (от старта процесса до первого QEvent.Paint).
+
+    python benchmarks/gui_startup.py --runs 7
+
+Без дисплея запускайте с QT_QPA_PLATFORM=offscreen. Каждый замер — отдельный процесс.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import time
+started = time.perf_counter()
+import sys
+from PyQt5.QtCore import QEvent, QObject
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+from src.main_window import MainWindow
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            print(time.perf_counter() - started)
+            app.exit()
+        return False
+
+window = MainWindow()
+probe = FirstPaint()
+window.installEventFilter(probe)
+window.show()
+app.exec_()
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    times = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, capture_output=True, text=True,
+                                check=True).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    print(f"первая отрисовка: медиана {statistics.median(times) * 1000:6.0f} ms, "
+          f"min {min(times) * 1000:6.0f} ms, max {max(times) * 1000:6.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
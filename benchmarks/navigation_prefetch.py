@@ -0,0 +1,68 @@
+"""Задержка клика «следующая неделя» / «следующий день» с фоновой подгрузкой соседей и без неё.
+
+    QT_QPA_PLATFORM=offscreen python benchmarks/navigation_prefetch.py --clicks 40
+
+Между кликами пауза --pause секунд, как у человека, листающего журнал; в конце печатаются
+счётчики попаданий Prefetcher. --latency добавляет задержку к каждому чтению хранилища,
+как у сетевого домашнего каталога.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+
+def measure(tab, step, clicks, pause, prefetch):
+    if not prefetch:
+        tab.prefetch.prefetch = lambda items: None
+    times = []
+    for _ in range(clicks):
+        started = time.perf_counter()
+        step()
+        times.append(time.perf_counter() - started)
+        deadline = time.perf_counter() + pause
+        while time.perf_counter() < deadline:
+            QApplication.processEvents()
+    stats = tab.prefetch.stats()
+    return statistics.median(times), stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clicks', type=int, default=40)
+    parser.add_argument('--pause', type=float, default=0.05)
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка чтения, с")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    from src.data_manager import DataManager
+    from src.schedule_tab import ScheduleTab
+    from src.homework_tab import HomeworkTab
+
+    with tempfile.TemporaryDirectory() as root:
+        shutil.copytree(os.path.join(ROOT, 'data'), root, dirs_exist_ok=True)
+        dm = DataManager(root=root)
+        if args.latency:
+            for method in ('schedule_timeline', 'load_homework_day'):
+                original = getattr(dm, method)
+                setattr(dm, method, lambda *a, original=original: time.sleep(args.latency) or original(*a))
+        for name, factory, step in (('неделя', ScheduleTab, 'next_week'), ('день', HomeworkTab, 'next_day')):
+            for prefetch in (False, True):
+                tab = factory(dm)
+                median, stats = measure(tab, getattr(tab, step), args.clicks, args.pause, prefetch)
+                print(f"{name:6s} {'с подгрузкой' if prefetch else 'без подгрузки':13s}: "
+                      f"медиана {median * 1000:6.2f} ms  попаданий {stats['hits']}  промахов {stats['misses']}")
+                tab.prefetch.pool.waitForDone()
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
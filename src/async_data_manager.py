@@ -0,0 +1,174 @@
+import asyncio
+import json
+from collections import OrderedDict
+from .search_index import SearchIndex
+
+# Ресурсы, об изменениях которых сообщает GET /events
+EVENT_RESOURCES = ('subjects', 'schedule', 'homework', 'grades')
+
+
+class AsyncDataManager:
+    # Асинхронный фасад над Storage для api.py: блокирующий ввод-вывод уходит в поток,
+    # одновременные чтения одного ресурса ждут один общий результат, а записи одного ресурса
+    # выстраиваются на asyncio.Lock, не занимая потоки ожиданием блокировки
+    def __init__(self, data_manager, rendered_size=256, poll_interval=1.0):
+        self.dm = data_manager
+        self._locks = {}
+        self._reads = {}
+        # Готовые JSON-ответы: key -> (версия ресурса, bytes); пока версия та же, диск и сериализация не нужны
+        self.rendered_size = rendered_size
+        self._rendered = OrderedDict()
+        # Подписчики на изменения хранилища (GET /events): по ограниченной очереди на клиента.
+        # Версия в событиях — resource_version (ETag); изменения других процессов находит опрос
+        # версий раз в poll_interval секунд, пока есть подписчики
+        self._subscribers = set()
+        self._loop = None
+        self.poll_interval = poll_interval
+        self._poller = None
+        self._published = {}
+        # Поисковый индекс ДЗ открывается при первом поиске. Строится под своей блокировкой, а не через
+        # _shared: после записи общие чтения забываются, и второй запрос построил бы второй индекс
+        self._search = None
+        self._search_lock = asyncio.Lock()
+
+    @property
+    def subscribed(self):
+        return bool(self._subscribers)
+
+    def subscribe(self, maxsize=64):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            # Уведомления приходят из рабочих потоков, в цикл событий их передаёт _on_changed
+            self.dm.subscribe(self._on_changed)
+        queue = asyncio.Queue(maxsize)
+        self._subscribers.add(queue)
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def _on_changed(self, resource, keys, version):
+        if resource not in EVENT_RESOURCES:
+            return
+        version = self.dm.resource_version(resource)
+        self._loop.call_soon_threadsafe(self._publish, {"resource": resource, "keys": keys, "version": version})
+
+    async def versions(self, resources):
+        return await asyncio.to_thread(lambda: {resource: self.dm.resource_version(resource) for resource in resources})
+
+    async def _poll(self):
+        # Записи других процессов (воркеры uvicorn, GUI на том же data/) уведомлений не дают:
+        # их видно только по смене версии. Такое событие без ключей — изменился весь ресурс
+        self._published.update(await self.versions(EVENT_RESOURCES))
+        while self._subscribers:
+            await asyncio.sleep(self.poll_interval)
+            for resource, version in (await self.versions(EVENT_RESOURCES)).items():
+                if self._published.get(resource) != version:
+                    self._publish({"resource": resource, "keys": [], "version": version})
+
+    def _publish(self, event):
+        self._published[event["resource"]] = event["version"]
+        for queue in self._subscribers:
+            if queue.full():
+                # Клиент не успевает читать: вместо потерянных событий он получит одно reset
+                # и перечитает всё целиком
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"resource": "*", "keys": [], "version": None, "reset": True})
+            else:
+                queue.put_nowait(event)
+
+    def _lock(self, resource):
+        lock = self._locks.get(resource)
+        if lock is None:
+            lock = self._locks[resource] = asyncio.Lock()
+        return lock
+
+    async def _shared(self, key, func, *args):
+        future = self._reads.get(key)
+        if future is None:
+            future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+            self._reads[key] = future
+            # После записи run() убирает ключ, и под ним может появиться новое чтение
+            future.add_done_callback(lambda done: self._reads.get(key) is done and self._reads.pop(key))
+        # Результат общий для всех ожидающих: его можно только сериализовать, но не менять
+        return await asyncio.shield(future)
+
+    async def version(self, resource):
+        return await self._shared(('resource_version', resource), self.dm.resource_version, resource)
+
+    async def render(self, resource, key, version, build):
+        cached = self._rendered.get(key)
+        if cached is not None and cached[0] == version:
+            self._rendered.move_to_end(key)
+            return cached[1]
+        body, current = await self._shared(('render', key, version), self._render, resource, version, build)
+        if not current:
+            # Ресурс изменили, пока собирался ответ: тело уже новее версии, кэшировать его под ней нельзя
+            return body
+        self._rendered[key] = (version, body)
+        self._rendered.move_to_end(key)
+        while len(self._rendered) > self.rendered_size:
+            self._rendered.popitem(last=False)
+        return body
+
+    def _render(self, resource, version, build):
+        # Те же параметры, что у JSONResponse, но сериализация идёт в потоке, а не в цикле событий
+        body = json.dumps(build(self.dm), ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+        return body, self.dm.resource_version(resource) == version
+
+    async def run(self, resources, func):
+        # func(dm) выполняется в потоке внутри dm.transaction(*resources)
+        acquired = []
+        try:
+            for resource in sorted(set(resources)):
+                await self._lock(resource).acquire()
+                acquired.append(resource)
+            return await asyncio.to_thread(self._run_locked, acquired, func)
+        finally:
+            if acquired:
+                self._forget_reads(acquired)
+            for resource in reversed(acquired):
+                self._lock(resource).release()
+
+    def _forget_reads(self, resources):
+        # Начатые до записи чтения не должны доставаться запросам, пришедшим после неё:
+        # иначе клиент получит старый ETag. Уже ожидающие дождутся своих результатов
+        for key in list(self._reads):
+            if key[0] != 'resource_version' or key[1] in resources:
+                del self._reads[key]
+
+    def _run_locked(self, resources, func):
+        with self.dm.transaction(*resources):
+            return func(self.dm)
+
+    async def search_homework(self, query, limit):
+        async with self._search_lock:
+            if self._search is None:
+                self._search = await asyncio.to_thread(SearchIndex, self.dm)
+        return await asyncio.to_thread(self._search_records, query, limit)
+
+    def _search_records(self, query, limit):
+        days = {}
+        results = []
+        for date, subject in self._search.search(query, limit):
+            if date not in days:
+                days[date] = self.dm.load_homework_day(date) or {}
+            if subject in days[date]:
+                results.append({"date": date, "subject": subject, "text": days[date][subject]})
+        return results
+
+    async def flush(self):
+        await asyncio.to_thread(self.dm.flush)
+        if self._search is not None:
+            await asyncio.to_thread(self._search.save)
+
+    async def close(self):
+        # Индекс отписывается от хранилища и сохраняется, хранилище отпускает каталог журнала
+        async with self._search_lock:
+            search, self._search = self._search, None
+        if search is not None:
+            await asyncio.to_thread(search.close)
+        await asyncio.to_thread(self.dm.close)
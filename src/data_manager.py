@@ -1,89 +1,101 @@
-from PyQt5.QtCore import QObject, pyqtSignal
-import json
+import threading
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from .storage import Storage, DAYS_OF_WEEK, MAX_LESSONS
+from .sqlite_data_manager import SqliteStorage
 
-DAYS_OF_WEEK = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
-MAX_LESSONS = 9
 
-class DataManager(QObject):
+class _Signals(QObject):
     subjects_updated = pyqtSignal()
     schedule_updated = pyqtSignal()
     homework_updated = pyqtSignal()
     grades_updated = pyqtSignal()
-    
-    def __init__(self):
+    # (ресурс, изменённые ключи — предметы или даты, номер версии); пустой список — изменилось всё
+    changed = pyqtSignal(str, list, int)
+    # (путь файла, текст ошибки) — фоновая запись не удалась, данные остались ждать записи.
+    # Излучается из потока пула; получателям в GUI-потоке сигнал приходит через очередь событий
+    save_failed = pyqtSignal(str, str)
+
+
+class _QtAdapter:
+    # Уведомления хранилища переизлучаются как сигналы для MainWindow и вкладок
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.signals = _Signals()
+        self.subjects_updated = self.signals.subjects_updated
+        self.schedule_updated = self.signals.schedule_updated
+        self.homework_updated = self.signals.homework_updated
+        self.grades_updated = self.signals.grades_updated
+        self.changed = self.signals.changed
+        self.save_failed = self.signals.save_failed
+        self.subscribe(self._emit)
+
+    def _emit(self, resource, keys, version):
+        getattr(self.signals, f'{resource}_updated').emit()
+        self.signals.changed.emit(resource, keys, version)
+
+
+class _WriteTask(QRunnable):
+    def __init__(self, manager, path):
         super().__init__()
-        self.schedule_file = 'data/schedule.json'
-        self.homework_file = 'data/homework.json'
-        self.subjects_file = 'data/subjects.json'
-        self.grades_file = 'data/grades.json'
-        self.hidden_subjects_file = 'data/hidden_subjects.json'
+        self.manager = manager
+        self.path = path
 
-    def load_subjects(self):
-        try:
-            with open(self.subjects_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-    
-    def save_subjects(self, data):
-        with open(self.subjects_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        self.subjects_updated.emit()
-
-    def load_schedule(self):
-        try:
-            with open(self.schedule_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                for day in DAYS_OF_WEEK:
-                    if day in data and isinstance(data[day], list):
-                        if all(isinstance(item, str) for item in data[day]):
-                            data[day] = [{
-                                "start_date": "1970-01-01",
-                                "subjects": data[day] + ['']*(MAX_LESSONS - len(data[day]))
-                            }]
-                return data
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {day: [{"start_date": "2024-01-01", "subjects": ['']*MAX_LESSONS}] for day in DAYS_OF_WEEK}
-
-    def save_schedule(self, data):
-        with open(self.schedule_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        self.schedule_updated.emit()
-
-    def load_homework(self):
-        try:
-            with open(self.homework_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-
-    def save_homework(self, data):
-        with open(self.homework_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        self.homework_updated.emit()
-    
-    def load_grades(self):
-        try:
-            with open(self.grades_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return {subject: list(grades.values()) for subject, grades in data.items()}
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-
-    def save_grades(self, data):
-        formatted_data = {subject: {f"grade_{i}": grade for i, grade in enumerate(grades)} 
-                        for subject, grades in data.items()}
-        with open(self.grades_file, 'w', encoding='utf-8') as f:
-            json.dump(formatted_data, f, ensure_ascii=False, indent=2)
-        self.grades_updated.emit()
-
-    def load_hidden_subjects(self):
+    def run(self):
+        self.manager._run_write(self.path)
+
+
+class _BackgroundWrites:
+    # Отложенные записи JSON уходят в QThreadPool, а не выполняются в GUI-потоке. По каждому
+    # файлу в работе не больше одной задачи: правки, пришедшие во время записи, копятся
+    # в _pending (новые данные заменяют старые) и уходят следующей записью того же файла
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(2)
+        self._in_flight = set()
+
+    def _schedule_flush(self):
+        # Вызывается под _cache_lock; write_delay по-прежнему склеивает частые правки
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.write_delay, self._dispatch_writes)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _dispatch_writes(self):
+        with self._cache_lock:
+            self._flush_timer = None
+            paths = [path for path in self._pending if path not in self._in_flight]
+            self._in_flight.update(paths)
+        for path in paths:
+            self.pool.start(_WriteTask(self, path))
+
+    def _run_write(self, path):
         try:
-            with open(self.hidden_subjects_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-
-    def save_hidden_subjects(self, hidden_subjects):
-        with open(self.hidden_subjects_file, 'w', encoding='utf-8') as f:
-            json.dump(hidden_subjects, f, ensure_ascii=False, indent=2)
+            self._write_behind(path)
+        except (OSError, TypeError, ValueError) as e:
+            # Повтор — со следующей правкой или при flush(), чтобы не засыпать UI сообщениями
+            with self._cache_lock:
+                self._in_flight.discard(path)
+            self.signals.save_failed.emit(path, str(e))
+            return
+        with self._cache_lock:
+            self._in_flight.discard(path)
+            if path in self._pending:
+                self._schedule_flush()
+
+    def flush(self):
+        # Дождаться очереди фоновых записей, затем записать то, что ещё ждёт
+        with self._cache_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        self.pool.waitForDone()
+        super().flush()
+
+
+class DataManager(_BackgroundWrites, _QtAdapter, Storage):
+    pass
+
+
+class SqliteDataManager(_QtAdapter, SqliteStorage):
+    pass
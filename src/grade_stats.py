@@ -0,0 +1,137 @@
+import numpy as np
+
+# Длина четвертей в учебных днях; она же вес четверти в итоговой оценке
+TERM_DAYS = [53, 44, 59, 45]
+
+# Коды клеток: 0 — пусто, 2..5 — отметки, -1 и -2 — пропуски
+EMPTY = 0
+ABSENT = -1  # 'Н'
+SICK = -2    # 'Б'
+# Числовая отметка вне списка ('4.5' через API): в средние идёт её значение из GradeStats.values
+OTHER = -3
+GRADE_CODES = {'2': 2, '3': 3, '4': 4, '5': 5, 'Н': ABSENT, 'Б': SICK}
+MARKS = np.arange(2, 6)
+
+
+class GradeStats:
+    # Оценки всех предметов в одном массиве предмет × четверть × клетка (int8) и агрегаты,
+    # посчитанные по нему сразу для всех предметов
+    def __init__(self, grades, term_weights=TERM_DAYS):
+        self.term_weights = np.asarray(term_weights, dtype=float)
+        self.subjects = list(grades)
+        self._rows = {subject: row for row, subject in enumerate(self.subjects)}
+        terms = len(self.term_weights)
+        slots = max((len(term_grades) for subject_grades in grades.values() if isinstance(subject_grades, list)
+                     for term_grades in subject_grades[:terms] if isinstance(term_grades, list)), default=0)
+        self.codes = np.zeros((len(self.subjects), terms, max(slots, 1)), dtype=np.int8)
+        self.values = np.zeros(self.codes.shape)
+        for row, subject_grades in enumerate(grades.values()):
+            if not isinstance(subject_grades, list):
+                continue
+            for term, term_grades in enumerate(subject_grades[:terms]):
+                if isinstance(term_grades, list):
+                    parsed = [_parse(value) for value in term_grades]
+                    self.codes[row, term, :len(parsed)] = [code for code, _ in parsed]
+                    self.values[row, term, :len(parsed)] = [number for _, number in parsed]
+        self._compute()
+
+    def _compute(self):
+        codes = self.codes
+        # distribution[s, t, k] — сколько отметок MARKS[k] у предмета s в четверти t
+        self.distribution = (codes[..., None] == MARKS).sum(axis=2)
+        other = codes == OTHER
+        self.other_counts = other.sum(axis=-1)
+        self.other_sums = np.where(other, self.values, 0).sum(axis=-1)
+        self.counts = self.distribution.sum(axis=-1) + self.other_counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.averages = (self.distribution @ MARKS + self.other_sums) / self.counts
+        self.absent = (codes == ABSENT).sum(axis=-1)
+        self.sick = (codes == SICK).sum(axis=-1)
+        # Итог — среднее по четвертям с весом их длины, только по четвертям, где есть отметки
+        weights = (self.counts > 0) * self.term_weights
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.finals = np.nan_to_num(self.averages) @ self.term_weights / weights.sum(axis=-1)
+            self.finals[weights.sum(axis=-1) == 0] = np.nan
+
+    def update(self, subject, term, idx, value):
+        # Одна изменённая клетка: агрегаты правятся только для её предмета и четверти
+        if subject not in self._rows:
+            self._rows[subject] = len(self.subjects)
+            self.subjects.append(subject)
+            self.codes = np.concatenate([self.codes, np.zeros((1,) + self.codes.shape[1:], dtype=np.int8)])
+            self.values = np.concatenate([self.values, np.zeros((1,) + self.values.shape[1:])])
+            self._compute()
+        if idx >= self.codes.shape[2]:
+            # Запас по клеткам растёт вдвое, чтобы не копировать массив на каждой новой клетке
+            padding = np.zeros(self.codes.shape[:2] + (max(idx + 1, 2 * self.codes.shape[2]) - self.codes.shape[2],),
+                               dtype=np.int8)
+            self.codes = np.concatenate([self.codes, padding], axis=2)
+            self.values = np.concatenate([self.values, padding.astype(float)], axis=2)
+        row = self._rows[subject]
+        old, old_number = int(self.codes[row, term, idx]), float(self.values[row, term, idx])
+        new, number = _parse(value)
+        if (old, old_number) == (new, number):
+            return
+        self.codes[row, term, idx] = new
+        self.values[row, term, idx] = number
+        for code, value_number, delta in ((old, old_number, -1), (new, number, 1)):
+            if code in MARKS:
+                self.distribution[row, term, code - MARKS[0]] += delta
+                self.counts[row, term] += delta
+            elif code == OTHER:
+                self.other_counts[row, term] += delta
+                self.other_sums[row, term] += delta * value_number
+                self.counts[row, term] += delta
+            elif code == ABSENT:
+                self.absent[row, term] += delta
+            elif code == SICK:
+                self.sick[row, term] += delta
+        count = self.counts[row, term]
+        self.averages[row, term] = ((self.distribution[row, term] @ MARKS + self.other_sums[row, term]) / count
+                                    if count else np.nan)
+        weights = (self.counts[row] > 0) * self.term_weights
+        total = weights.sum()
+        self.finals[row] = np.nan_to_num(self.averages[row]) @ self.term_weights / total if total else np.nan
+
+    def average(self, subject, term):
+        row = self._rows.get(subject)
+        if row is None or not self.counts[row, term]:
+            return None
+        return float(self.averages[row, term])
+
+    def to_dict(self):
+        result = {}
+        for row, subject in enumerate(self.subjects):
+            terms = []
+            for term in range(self.codes.shape[1]):
+                terms.append({
+                    "average": _round(self.averages[row, term]),
+                    "count": int(self.counts[row, term]),
+                    "distribution": {str(mark): int(n) for mark, n in zip(MARKS, self.distribution[row, term])},
+                    "absent": int(self.absent[row, term]),
+                    "sick": int(self.sick[row, term]),
+                })
+            final = self.finals[row]
+            result[subject] = {
+                "terms": terms,
+                "final": _round(final),
+                # Итоговая отметка округляется по правилам школы: 4.5 -> 5
+                "mark": None if np.isnan(final) else int(np.floor(final + 0.5)),
+            }
+        return result
+
+
+def _parse(value):
+    # (код клетки, числовое значение для OTHER). Как и прежний подсчёт среднего во вкладке,
+    # в отметки идёт любая неотрицательная десятичная запись, а не только 2..5
+    text = str(value).strip()
+    code = GRADE_CODES.get(text)
+    if code is not None:
+        return code, 0.0
+    if text.replace('.', '', 1).isdigit():
+        return OTHER, float(text)
+    return EMPTY, 0.0
+
+
+def _round(value):
+    return None if np.isnan(value) else round(float(value), 2)
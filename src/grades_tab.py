@@ -1,18 +1,201 @@
+from collections import Counter
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+    QWidget, QVBoxLayout, QHBoxLayout, QTableView, QAbstractItemView, QStyledItemDelegate,
     QPushButton, QHeaderView, QMessageBox, QDialog, QListWidget, 
     QDialogButtonBox, QButtonGroup, QComboBox, QSizePolicy
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
 from .data_manager import DataManager
+from .grade_stats import GradeStats, TERM_DAYS
+
+
+class GradesModel(QAbstractTableModel):
+    # Строки — видимые предметы, столбцы — "Предмет", клетки текущей четверти и "Среднее"
+    def __init__(self, data_manager, grades, stats, term_days):
+        super().__init__()
+        self.data_manager = data_manager
+        self.term_days = term_days
+        self.subjects = []
+        self.current_term = 0
+        self.max_columns = 1
+        self.writing = False
+        self.load(grades, stats)
+
+    def load(self, grades, stats):
+        # Сколько клеток заполнено у каждого предмета в каждой четверти и сколько предметов
+        # на каждом таком уровне: по ним максимум поддерживается за O(1) на правку
+        self.grades = grades
+        self.stats = stats
+        self._filled = {}
+        self._levels = [Counter() for _ in self.term_days]
+        for subject, subject_grades in grades.items():
+            if not isinstance(subject_grades, list) or len(subject_grades) != 4:
+                continue
+            counts = [len([g for g in term_grades if g]) if isinstance(term_grades, list) else 0
+                      for term_grades in subject_grades]
+            self._filled[subject] = counts
+            for term, count in enumerate(counts):
+                self._levels[term][count] += 1
+        self._max_filled = [max(levels, default=0) for levels in self._levels]
+
+    def _count(self, subject, term, delta):
+        counts = self._filled.setdefault(subject, [0] * len(self.term_days))
+        levels = self._levels[term]
+        old = counts[term]
+        if old in levels:
+            levels[old] -= 1
+            if not levels[old]:
+                del levels[old]
+        counts[term] = old + delta
+        levels[old + delta] += 1
+        if old + delta > self._max_filled[term]:
+            self._max_filled[term] = old + delta
+        elif old == self._max_filled[term] and old not in levels:
+            self._max_filled[term] = old + delta
+
+    def reset(self, subjects=None, term=None):
+        self.beginResetModel()
+        if subjects is not None:
+            self.subjects = subjects
+        if term is not None:
+            self.current_term = term
+        self.max_columns = self._calculate_max_columns()
+        self.endResetModel()
+
+    def _calculate_max_columns(self):
+        return min(self._max_filled[self.current_term] + 1, self.term_days[self.current_term])
+
+    def _average(self, subject):
+        average = self.stats.average(subject, self.current_term)
+        return f"{average:.2f}" if average is not None else "0.00"
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.subjects)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.max_columns + 2
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            return str(section + 1)
+        if section == 0:
+            return "Предмет"
+        if section == self.max_columns + 1:
+            return "Среднее"
+        return str(section)
+
+    def flags(self, index):
+        if 0 < index.column() <= self.max_columns:
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        subject = self.subjects[index.row()]
+        column = index.column()
+        if column == 0:
+            return subject
+        if column == self.max_columns + 1:
+            return self._average(subject)
+        grades = self.grades.get(subject, [[], [], [], []])
+        term_grades = grades[self.current_term] if len(grades) > self.current_term else []
+        return term_grades[column - 1] if column - 1 < len(term_grades) else ''
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not self.flags(index) & Qt.ItemIsEditable:
+            return False
+        row, column = index.row(), index.column()
+        subject = self.subjects[row]
+        day_idx = column - 1
+        if subject not in self.grades:
+            self.grades[subject] = [[], [], [], []]
+        grades = self.grades[subject]
+        if not isinstance(grades, list) or len(grades) != 4:
+            grades = [[], [], [], []]
+            self.grades[subject] = grades
+        term_grades = grades[self.current_term]
+        if not isinstance(term_grades, list):
+            term_grades = []
+            grades[self.current_term] = term_grades
+        previous = term_grades[day_idx] if day_idx < len(term_grades) else ''
+        if previous == value:
+            return False
+        while len(term_grades) < day_idx + 1:
+            term_grades.append('')
+        term_grades[day_idx] = value
+        term_grades[:] = term_grades[:self.term_days[self.current_term]]
+        self.writing = True
+        try:
+            self.data_manager.set_grade(subject, self.current_term, day_idx, value)
+        finally:
+            self.writing = False
+        self.stats.update(subject, self.current_term, day_idx, value)
+        if bool(previous) != bool(value):
+            self._count(subject, self.current_term, 1 if value else -1)
+
+        # Правка меняет заполненность на одну клетку, поэтому сетка растёт или сжимается
+        # ровно на один столбец перед "Средним"
+        columns = self._calculate_max_columns()
+        if columns > self.max_columns:
+            self.beginInsertColumns(QModelIndex(), self.max_columns + 1, self.max_columns + 1)
+            self.max_columns = columns
+            self.endInsertColumns()
+        elif columns < self.max_columns:
+            self.beginRemoveColumns(QModelIndex(), self.max_columns, self.max_columns)
+            self.max_columns = columns
+            self.endRemoveColumns()
+        # Изменились клетка и среднее той же строки — одно уведомление на оба
+        self.dataChanged.emit(self.index(row, min(column, self.max_columns)), self.index(row, self.max_columns + 1),
+                              [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+
+class GradeDelegate(QStyledItemDelegate):
+    def __init__(self, options, parent=None):
+        super().__init__(parent)
+        self.options = options
+
+    def createEditor(self, parent, option, index):
+        combo = QComboBox(parent)
+        combo.addItems(self.options)
+        combo.activated.connect(lambda _: self._commit(combo))
+        QTimer.singleShot(0, combo.showPopup)
+        return combo
+
+    def _commit(self, combo):
+        combo.setProperty('picked', True)
+        self.commitData.emit(combo)
+        self.closeEditor.emit(combo)
+
+    def setEditorData(self, editor, index):
+        value = index.data(Qt.EditRole)
+        position = editor.findText(value)
+        if position == -1 and value:
+            # Значение не из списка (например, '4.5' через API) показывается как есть
+            editor.addItem(value)
+            position = editor.count() - 1
+        editor.setCurrentIndex(max(position, 0))
+
+    def setModelData(self, editor, model, index):
+        # Пишем только выбранное пользователем: уход фокуса из редактора ничего не меняет
+        if editor.property('picked'):
+            model.setData(index, editor.currentText(), Qt.EditRole)
 
 class GradesTab(QWidget):
     def __init__(self, data_manager):
         super().__init__()
         self.data_manager = data_manager
         self.grades = self._safe_load_grades()
+        self.stats = GradeStats(self.grades)
         self.hidden_subjects = set(self.data_manager.load_hidden_subjects())
-        self.term_days = [53, 44, 59, 45]
+        self.term_days = list(TERM_DAYS)
         self.current_term = 0
         self.grade_options = ['', '2', '3', '4', '5', 'Н', 'Б']
         self.initUI()
@@ -20,10 +203,17 @@ class GradesTab(QWidget):
     def initUI(self):
         layout = QVBoxLayout()
         layout.setContentsMargins(10, 10, 10, 10)
-        self.table = QTableWidget()
+        self.model = GradesModel(self.data_manager, self.grades, self.stats, self.term_days)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        # После setModel: заголовок таблицы должен узнать о новых столбцах раньше нас
+        self.model.modelReset.connect(self._setup_table_columns)
+        self.model.columnsInserted.connect(lambda _, first, last: self.table.setColumnWidth(first, 60))
+        # Редактор (выпадающий список) создаётся только для клетки, которую сейчас правят
+        self.table.setItemDelegate(GradeDelegate(self.grade_options, self.table))
+        self.table.setEditTriggers(QAbstractItemView.CurrentChanged | QAbstractItemView.SelectedClicked)
         self.table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.table.verticalHeader().setDefaultSectionSize(40)
-        self._setup_table_columns()
         layout.addLayout(self._create_control_layout())
         layout.addWidget(self.table)
         self.setLayout(layout)
@@ -58,7 +248,7 @@ class GradesTab(QWidget):
                 qproperty-alignment: AlignCenter;
             }
             
-            QTableWidget {
+            QTableView {
                 font-size: 12pt;
                 background-color: #f9f9f9;
                 gridline-color: #ddd;
@@ -71,11 +261,11 @@ class GradesTab(QWidget):
                 background-color: #e0e0e0;
             }
             
-            QTableWidget::item {
+            QTableView::item {
                 border: 1px solid #ddd;
             }
             
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #cce8ff;
                 color: #000;
             }
@@ -133,37 +323,11 @@ class GradesTab(QWidget):
         return control_layout
 
     def _setup_table_columns(self):
-        max_visible = self._calculate_max_columns()
-        columns = ["Предмет"] + [f"{i+1}" for i in range(max_visible)] + ["Среднее"]
-        self.table.setColumnCount(len(columns))
-        self.table.setHorizontalHeaderLabels(columns)
+        last = self.model.columnCount() - 1
         self.table.setColumnWidth(0, 200)
-        for i in range(1, len(columns)-1):
+        for i in range(1, last):
             self.table.setColumnWidth(i, 60)
-        self.table.setColumnWidth(len(columns)-1, 100)
-
-    def _calculate_max_columns(self):
-        max_days = self.term_days[self.current_term]
-        max_filled = 1
-        for subject in self.grades.values():
-            if not isinstance(subject, list) or len(subject) != 4:
-                continue
-            term_grades = subject[self.current_term] if len(subject) > self.current_term else []
-            if not isinstance(term_grades, list):
-                continue
-            filled = len([g for g in term_grades if g])
-            max_filled = max(max_filled, filled + 1)
-        return min(max_filled, max_days)
-
-    def _calculate_average(self, subject):
-        grades = self.grades.get(subject, [[], [], [], []])
-        if not isinstance(grades, list) or len(grades) != 4:
-            return "0.00"
-        term_grades = grades[self.current_term] if len(grades) > self.current_term else []
-        if not isinstance(term_grades, list):
-            return "0.00"
-        valid = [float(v) for v in term_grades if v and str(v).replace('.', '', 1).isdigit()]
-        return f"{sum(valid)/len(valid):.2f}" if valid else "0.00"
+        self.table.setColumnWidth(last, 100)
 
     def _restore_subjects(self, list_widget, dialog):
         selected = list_widget.selectedItems()
@@ -184,71 +348,10 @@ class GradesTab(QWidget):
         return raw_grades
 
     def update_table(self):
-        self.table.blockSignals(True)
-        self.table.setRowCount(0)
         subjects = [s for s in self.data_manager.load_subjects() if s not in self.hidden_subjects]
-        self.table.setRowCount(len(subjects))
-        max_columns = self._calculate_max_columns()
-
-        for row, subject in enumerate(subjects):
-            subject_item = QTableWidgetItem(subject)
-            subject_item.setTextAlignment(Qt.AlignCenter)
-            self.table.setItem(row, 0, subject_item)
-
-            grades = self.grades.get(subject, [[], [], [], []])
-            term_grades = grades[self.current_term] if len(grades) > self.current_term else []
-
-            for col in range(1, max_columns + 1):
-                combo = QComboBox()
-                combo.addItems(self.grade_options)
-                value = term_grades[col-1] if (col-1) < len(term_grades) else ''
-                index = combo.findText(value)
-                combo.setCurrentIndex(index if index != -1 else 0)
-                combo.currentTextChanged.connect(lambda text, r=row, c=col: self.on_grade_changed(text, r, c))
-                self.table.setCellWidget(row, col, combo)
-
-            avg_item = QTableWidgetItem(self._calculate_average(subject))
-            avg_item.setTextAlignment(Qt.AlignCenter)
-            avg_item.setFlags(Qt.ItemIsEnabled)
-            self.table.setItem(row, max_columns + 1, avg_item)
-
-        self.table.blockSignals(False)
+        self.model.reset(subjects=subjects)
         self.update_buttons_state()
 
-    def on_grade_changed(self, value, row, column):
-        subject = self.table.item(row, 0).text()
-        day_idx = column - 1
-        if subject not in self.grades:
-            self.grades[subject] = [[], [], [], []]
-        grades = self.grades[subject]
-        if not isinstance(grades, list) or len(grades) != 4:
-            grades = [[], [], [], []]
-            self.grades[subject] = grades
-        term_grades = grades[self.current_term]
-        if not isinstance(term_grades, list):
-            term_grades = []
-            grades[self.current_term] = term_grades
-        while len(term_grades) < day_idx + 1:
-            term_grades.append('')
-        term_grades[day_idx] = value
-        term_grades[:] = term_grades[:self.term_days[self.current_term]]
-        self.data_manager.save_grades(self.grades)
-    
-        prev_max = self._calculate_max_columns()
-        self._setup_table_columns()
-        current_max = self._calculate_max_columns()
-        if current_max != prev_max:
-            self.update_table()
-        else:
-            avg_col = self.table.columnCount() - 1
-            avg_item = self.table.item(row, avg_col)
-            if avg_item is not None:
-                avg_item.setText(self._calculate_average(subject))
-    
-        if column == self._calculate_max_columns():
-            self._setup_table_columns()
-            self.update_table()
-
     def show_hidden_dialog(self):
         dialog = QDialog(self)
         dialog.setWindowTitle("Скрытые предметы")
@@ -264,9 +367,9 @@ class GradesTab(QWidget):
         dialog.exec_()
 
     def hide_subject(self):
-        row = self.table.currentRow()
+        row = self.table.currentIndex().row()
         if row >= 0:
-            subject = self.table.item(row, 0).text()
+            subject = self.model.subjects[row]
             self.hidden_subjects.add(subject)
             self.data_manager.save_hidden_subjects(list(self.hidden_subjects))
             self.update_table()
@@ -275,11 +378,15 @@ class GradesTab(QWidget):
         self.show_hidden_btn.setEnabled(len(self.hidden_subjects) > 0)
 
     def refresh_data(self):
+        if self.model.writing:
+            # grades_updated от собственной правки: модель уже знает о ней
+            return
         self.grades = self._safe_load_grades()
+        self.stats = GradeStats(self.grades)
         self.hidden_subjects = set(self.data_manager.load_hidden_subjects())
+        self.model.load(self.grades, self.stats)
         self.update_table()
 
     def set_current_term(self, term_idx):
         self.current_term = term_idx
-        self._setup_table_columns()
-        self.update_table()
+        self.model.reset(term=term_idx)
@@ -1,23 +1,31 @@
 from PyQt5.QtWidgets import (
     QWidget, QHBoxLayout, QHeaderView, QVBoxLayout, QPushButton, QLabel, 
     QTableWidget, QTableWidgetItem, QStackedWidget, QTextBrowser, 
-    QTextEdit, QMessageBox
+    QTextEdit, QMessageBox, QCheckBox, QLineEdit, QListWidget, QListWidgetItem
 )
 from PyQt5.QtCore import Qt, QDate, QTimer, QItemSelectionModel
 from PyQt5.QtGui import QIcon
-import markdown
 from .data_manager import DataManager, DAYS_OF_WEEK, MAX_LESSONS
+from .markdown_cache import MarkdownCache
+from .search_index import SearchIndex
+from .prefetch import Prefetcher
+
+# Пауза в наборе, после которой обновляется живой предпросмотр, мс
+LIVE_PREVIEW_DELAY = 300
 
 class HomeworkTab(QWidget):
     def __init__(self, data_manager):
         super().__init__()
         self.data_manager = data_manager
-        self.homework = self.data_manager.load_homework()
         self.current_date = QDate.currentDate()
         self.current_subject = None
         self.edit_mode = False
         self.unsaved_changes = False
         self.edit_started = False
+        self.markdown = MarkdownCache()
+        # Индекс открывается при первом поиске и дальше сам следит за изменениями ДЗ
+        self.search_index = None
+        self.prefetch = Prefetcher(self.data_manager)
         self.initUI()
 
     def initUI(self):
@@ -25,6 +33,16 @@ class HomeworkTab(QWidget):
         
         # Левая панель: навигация и таблица
         left_panel = QVBoxLayout()
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Поиск по заданиям")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.returnPressed.connect(self.search_homework)
+        self.search_edit.textChanged.connect(lambda text: text.strip() or self.search_results.setVisible(False))
+        self.search_results = QListWidget()
+        self.search_results.setVisible(False)
+        self.search_results.itemClicked.connect(self.open_search_result)
+
         nav_layout = QHBoxLayout()
         
         self.prev_day_btn = QPushButton('← Предыдущий')
@@ -51,6 +69,8 @@ class HomeworkTab(QWidget):
         self.schedule_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.schedule_table.verticalHeader().setDefaultSectionSize(40)
         
+        left_panel.addWidget(self.search_edit)
+        left_panel.addWidget(self.search_results)
         left_panel.addLayout(nav_layout)
         left_panel.addWidget(self.day_of_week_label)
         left_panel.addWidget(self.schedule_table)
@@ -60,21 +80,41 @@ class HomeworkTab(QWidget):
         
         self.toggle_edit_btn = QPushButton("Редактировать")
         self.save_btn = QPushButton("Сохранить")
+        self.live_preview_check = QCheckBox("Предпросмотр при вводе")
         self.toggle_edit_btn.clicked.connect(self.toggle_edit_mode)
         self.save_btn.clicked.connect(self.save_homework)
+        self.live_preview_check.toggled.connect(self.toggle_live_preview)
         self.toggle_edit_btn.setEnabled(False)
         self.save_btn.setVisible(False)
+        self.live_preview_check.setVisible(False)
         
         self.preview_browser = QTextBrowser()
         self.homework_edit = QTextEdit()
         self.homework_edit.textChanged.connect(self.mark_unsaved_changes)
+        self.homework_edit.textChanged.connect(self.schedule_live_preview)
+
+        # Живой предпросмотр перерисовывается после паузы в наборе, а не на каждую клавишу
+        self.live_preview = QTextBrowser()
+        self.live_preview.setVisible(False)
+        self.live_preview_timer = QTimer(self)
+        self.live_preview_timer.setSingleShot(True)
+        self.live_preview_timer.setInterval(LIVE_PREVIEW_DELAY)
+        self.live_preview_timer.timeout.connect(self.update_live_preview)
+
+        editor_page = QWidget()
+        editor_layout = QHBoxLayout(editor_page)
+        editor_layout.setContentsMargins(0, 0, 0, 0)
+        editor_layout.addWidget(self.homework_edit)
+        editor_layout.addWidget(self.live_preview)
         
         self.stack = QStackedWidget()
         self.stack.addWidget(self.preview_browser)
-        self.stack.addWidget(self.homework_edit)
+        self.stack.addWidget(editor_page)
+        self.editor_page = editor_page
         
         right_panel.addWidget(self.toggle_edit_btn)
         right_panel.addWidget(self.save_btn)
+        right_panel.addWidget(self.live_preview_check)
         right_panel.addWidget(self.stack)
         
         main_layout.addLayout(left_panel, 1)
@@ -138,6 +178,14 @@ class HomeworkTab(QWidget):
             QTextEdit:focus {
                 border-color: #66afe9;
             }
+
+            QLineEdit {
+                font-size: 14px;
+                padding: 6px;
+                border: 1px solid #ccc;
+                border-radius: 5px;
+                background-color: #fff;
+            }
             
             QLabel {
                 font-size: 14px;
@@ -152,14 +200,19 @@ class HomeworkTab(QWidget):
             
         self.edit_mode = not self.edit_mode
         if self.edit_mode:
-            self.stack.setCurrentWidget(self.homework_edit)
+            self.stack.setCurrentWidget(self.editor_page)
             self.toggle_edit_btn.setText("Отменить")
             self.save_btn.setVisible(True)
+            self.live_preview_check.setVisible(True)
             self.edit_started = True
+            if self.live_preview_check.isChecked():
+                self.update_live_preview()
         else:
             self.stack.setCurrentWidget(self.preview_browser)
             self.toggle_edit_btn.setText("Редактировать")
             self.save_btn.setVisible(False)
+            self.live_preview_check.setVisible(False)
+            self.live_preview_timer.stop()
             self.edit_started = False
             self.update_preview()
 
@@ -167,15 +220,27 @@ class HomeworkTab(QWidget):
         if self.current_subject and self.unsaved_changes:
             date_str = self.current_date.toString("yyyy-MM-dd")
             text = self.homework_edit.toPlainText()
-            self.homework.setdefault(date_str, {})[self.current_subject] = text
-            self.data_manager.save_homework(self.homework)
+            self.data_manager.set_homework(date_str, self.current_subject, text)
             self.unsaved_changes = False
             self.edit_started = False
             self.update_preview()
 
     def update_preview(self):
-        html = markdown.markdown(self.homework_edit.toPlainText())
-        self.preview_browser.setHtml(html)
+        self.preview_browser.setHtml(self.markdown.render(self.homework_edit.toPlainText()))
+
+    def toggle_live_preview(self, enabled):
+        self.live_preview.setVisible(enabled)
+        if enabled:
+            self.update_live_preview()
+        else:
+            self.live_preview_timer.stop()
+
+    def schedule_live_preview(self):
+        if self.edit_mode and self.live_preview_check.isChecked():
+            self.live_preview_timer.start()
+
+    def update_live_preview(self):
+        self.live_preview.setHtml(self.markdown.render(self.homework_edit.toPlainText()))
 
     def check_unsaved_changes(self):
         if self.edit_started and self.unsaved_changes:
@@ -207,8 +272,7 @@ class HomeworkTab(QWidget):
             self.load_homework()
 
     def load_homework(self):
-        date_str = self.current_date.toString("yyyy-MM-dd")
-        hw_data = self.homework.get(date_str, {})
+        _, hw_data = self.prefetch.get(*self._day_item(self.current_date))
         self.homework_edit.setPlainText(hw_data.get(self.current_subject, ""))
         self.update_preview()
 
@@ -216,9 +280,7 @@ class HomeworkTab(QWidget):
         self.schedule_table.blockSignals(True)
         day_index = self.current_date.dayOfWeek() - 1
         day_name = DAYS_OF_WEEK[day_index] if day_index < len(DAYS_OF_WEEK) else ""
-        
-        schedule = self.get_schedule_for_date(self.current_date)
-        subjects = schedule.get(day_name, [''] * MAX_LESSONS)
+        subjects, _ = self.prefetch.get(*self._day_item(self.current_date))
         
         self.day_of_week_label.setText(day_name)
         for row in range(MAX_LESSONS):
@@ -228,20 +290,20 @@ class HomeworkTab(QWidget):
             
         self.schedule_table.blockSignals(False)
         self.date_label.setText(self.current_date.toString("dd.MM.yyyy"))
+        # Соседние дни (уроки и задания) готовятся в фоне до следующего клика
+        self.prefetch.prefetch([self._day_item(self.current_date.addDays(-1)),
+                                self._day_item(self.current_date.addDays(1))])
+
+    def _day_item(self, target_date):
+        # (ключ, загрузка) дня для Prefetcher: предметы по расписанию и задания на дату
+        date_str = target_date.toString("yyyy-MM-dd")
+        day_index = target_date.dayOfWeek() - 1
+        day_name = DAYS_OF_WEEK[day_index] if day_index < len(DAYS_OF_WEEK) else ""
 
-    def get_schedule_for_date(self, target_date):
-        target_date_str = target_date.toString("yyyy-MM-dd")
-        schedule = {}
-        for day in DAYS_OF_WEEK:
-            day_schedule = self.data_manager.load_schedule().get(day, [])
-            latest_subjects = [''] * MAX_LESSONS
-            for version in sorted(day_schedule, key=lambda x: x['start_date'], reverse=True):
-                if version['start_date'] <= target_date_str:
-                    subjects = version.get('subjects', [])
-                    latest_subjects = [str(s).strip() for s in subjects[:MAX_LESSONS]] + ['']*(MAX_LESSONS - len(subjects))
-                    break
-            schedule[day] = latest_subjects
-        return schedule
+        def load():
+            schedule = self.data_manager.schedule_timeline().subjects_for(date_str)
+            return schedule.get(day_name, [''] * MAX_LESSONS), self.data_manager.load_homework_day(date_str) or {}
+        return ('day', date_str), load
 
     def prev_day(self):
         if not self.check_unsaved_changes(): 
@@ -265,10 +327,57 @@ class HomeworkTab(QWidget):
         self.toggle_edit_btn.setEnabled(False)
         self.stack.setCurrentWidget(self.preview_browser)
 
+    def search_homework(self):
+        query = self.search_edit.text().strip()
+        if not query:
+            return
+        if self.search_index is None:
+            self.search_index = SearchIndex(self.data_manager)
+        self.search_results.clear()
+        days = {}
+        for date, subject in self.search_index.search(query):
+            if date not in days:
+                days[date] = self.data_manager.load_homework_day(date) or {}
+            text = str(days[date].get(subject, '')).strip().splitlines()
+            found = QDate.fromString(date, "yyyy-MM-dd")
+            label = found.toString("dd.MM.yyyy") if found.isValid() else date
+            item = QListWidgetItem(f"{label} — {subject}: {text[0] if text else ''}")
+            item.setData(Qt.UserRole, (date, subject))
+            self.search_results.addItem(item)
+        if not self.search_results.count():
+            item = QListWidgetItem("Ничего не найдено")
+            item.setFlags(Qt.NoItemFlags)
+            self.search_results.addItem(item)
+        self.search_results.setVisible(True)
+
+    def open_search_result(self, item):
+        found = item.data(Qt.UserRole)
+        if not found or not self.check_unsaved_changes():
+            return
+        date, subject = found
+        target = QDate.fromString(date, "yyyy-MM-dd")
+        if not target.isValid():
+            return
+        self.current_date = target
+        self.update_schedule()
+        self._clear_selection()
+        for row in range(MAX_LESSONS):
+            cell = self.schedule_table.item(row, 0)
+            if cell is not None and cell.text() == subject:
+                self.schedule_table.setCurrentCell(row, 0)
+                break
+        # Предмет мог уйти из расписания этого дня, а задание по нему осталось
+        self.current_subject = subject
+        self.toggle_edit_btn.setEnabled(True)
+        self.load_homework()
+
+    def flush(self):
+        if self.search_index is not None:
+            self.search_index.save()
+
     def mark_unsaved_changes(self):
         self.unsaved_changes = True
 
     def refresh_data(self):
-        self.homework = self.data_manager.load_homework()
         self.update_schedule()
         self._clear_selection()
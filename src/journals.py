@@ -0,0 +1,53 @@
+import os
+import re
+from collections import OrderedDict
+from .storage import Storage
+from .async_data_manager import AsyncDataManager
+
+# Идентификатор журнала становится именем каталога, поэтому никаких '/', '..' и прочего
+JOURNAL_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+
+class JournalRegistry:
+    # Журналы школы: каталог base_dir/<id> на каждый. Открытыми держится не больше capacity
+    # журналов; давно не использованный закрывается вместе со своими кэшами и блокировками
+    def __init__(self, base_dir, capacity=64, rendered_size=32):
+        self.base_dir = base_dir
+        self.capacity = capacity
+        self.rendered_size = rendered_size
+        self._open = OrderedDict()
+
+    def path(self, journal_id):
+        if not JOURNAL_ID.fullmatch(journal_id):
+            raise ValueError(f"Неверный идентификатор журнала: {journal_id}")
+        return os.path.join(self.base_dir, journal_id)
+
+    def create(self, journal_id):
+        try:
+            os.makedirs(self.path(journal_id))
+        except FileExistsError:
+            return False
+        return True
+
+    async def get(self, journal_id):
+        journal = self._open.get(journal_id)
+        if journal is not None:
+            self._open.move_to_end(journal_id)
+            return journal
+        root = self.path(journal_id)
+        if not os.path.isdir(root):
+            raise KeyError(journal_id)
+        journal = AsyncDataManager(Storage(root=root), rendered_size=self.rendered_size)
+        self._open[journal_id] = journal
+        # Журналы с подписчиками GET /events не вытесняются: их события шли бы в закрытый экземпляр.
+        # Запросы, которые ещё держат вытесненный журнал, спокойно доработают: файловые
+        # блокировки общие и для его нового экземпляра
+        idle = [key for key, item in self._open.items() if key != journal_id and not item.subscribed]
+        for key in idle[:max(0, len(self._open) - self.capacity)]:
+            await self._open.pop(key).close()
+        return journal
+
+    async def close(self):
+        while self._open:
+            _, journal = self._open.popitem(last=False)
+            await journal.close()
@@ -1,9 +1,38 @@
-from PyQt5.QtWidgets import QMainWindow, QTabWidget
-from .data_manager import DataManager
-from .homework_tab import HomeworkTab
-from .schedule_tab import ScheduleTab
-from .subjects_tab import SubjectsTab
-from .grades_tab import GradesTab
+from PyQt5.QtWidgets import QMainWindow, QTabWidget, QWidget, QMessageBox
+import os
+from .data_manager import DataManager, SqliteDataManager
+
+
+# Модули вкладок импортируются при первом открытии вкладки; явные import внутри функций
+# нужны, чтобы их видел PyInstaller
+
+def _schedule_tab(data_manager):
+    from .schedule_tab import ScheduleTab
+    return ScheduleTab(data_manager)
+
+
+def _homework_tab(data_manager):
+    from .homework_tab import HomeworkTab
+    return HomeworkTab(data_manager)
+
+
+def _subjects_tab(data_manager):
+    from .subjects_tab import SubjectsTab
+    return SubjectsTab(data_manager)
+
+
+def _grades_tab(data_manager):
+    from .grades_tab import GradesTab
+    return GradesTab(data_manager)
+
+
+# (заголовок, фабрика, сигналы DataManager, по которым вкладка перечитывает данные)
+TABS = [
+    ('Расписание', _schedule_tab, ('subjects_updated', 'schedule_updated')),
+    ('Домашние задания', _homework_tab, ('homework_updated',)),
+    ('Предметы', _subjects_tab, ('subjects_updated',)),
+    ('Оценки', _grades_tab, ('grades_updated',)),
+]
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -11,7 +40,9 @@ class MainWindow(QMainWindow):
         self.setWindowTitle('Школьный дневник')
         self.setGeometry(100, 100, 800, 600)
         
-        self.data_manager = DataManager()
+        db_path = os.environ.get('JOURNAL_DB')
+        self.data_manager = (SqliteDataManager(db_path) if db_path else
+                             DataManager(write_delay=0.5, journal_mode=os.environ.get('JOURNAL_LOG') == '1'))
         self.tabs = QTabWidget()
         
         self._init_tabs()
@@ -20,17 +51,61 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(self.tabs)
 
     def _init_tabs(self):
-        self.tabs.addTab(ScheduleTab(self.data_manager), 'Расписание')
-        self.tabs.addTab(HomeworkTab(self.data_manager), 'Домашние задания')
-        self.tabs.addTab(SubjectsTab(self.data_manager), 'Предметы')
-        self.tabs.addTab(GradesTab(self.data_manager), 'Оценки')
+        # До первого открытия на месте вкладки пустая заглушка; сразу строится только текущая
+        self._built = {}
+        for title, _, _ in TABS:
+            self.tabs.addTab(QWidget(), title)
+        self.tabs.currentChanged.connect(self._ensure_tab)
+        self._ensure_tab(self.tabs.currentIndex())
+
+    def _ensure_tab(self, index):
+        if index < 0 or index in self._built:
+            return
+        title, factory, _ = TABS[index]
+        widget = factory(self.data_manager)
+        self._built[index] = widget
+        self.tabs.blockSignals(True)
+        placeholder = self.tabs.widget(index)
+        self.tabs.removeTab(index)
+        self.tabs.insertTab(index, widget, title)
+        self.tabs.setCurrentIndex(index)
+        self.tabs.blockSignals(False)
+        placeholder.deleteLater()
 
     def _connect_signals(self):
-        self.data_manager.subjects_updated.connect(self.tabs.widget(0).refresh_data)
-        self.data_manager.schedule_updated.connect(self.tabs.widget(0).refresh_data)
-        self.data_manager.homework_updated.connect(self.tabs.widget(1).refresh_data)
-        self.data_manager.subjects_updated.connect(self.tabs.widget(2).refresh_data)
-        self.data_manager.grades_updated.connect(self.tabs.widget(3).refresh_data)
+        # Сигналы подключены к индексу вкладки, а не к виджету: ещё не созданная вкладка ничего
+        # не пропустит, потому что при создании сама читает свежие данные
+        for index, (_, _, signals) in enumerate(TABS):
+            for name in signals:
+                getattr(self.data_manager, name).connect(lambda index=index: self._refresh_tab(index))
+        self.data_manager.save_failed.connect(self._on_save_failed)
+
+    def _on_save_failed(self, path, message):
+        QMessageBox.warning(self, 'Ошибка сохранения',
+                            f'Не удалось записать {os.path.basename(path)}: {message}\n'
+                            'Изменения сохранены в памяти и будут записаны при следующей правке или при выходе.')
+
+    def _refresh_tab(self, index):
+        widget = self._built.get(index)
+        if widget is not None:
+            widget.refresh_data()
+
+    def closeEvent(self, event):
+        # flush() дожидается фоновых записей и дописывает оставшееся
+        try:
+            self.data_manager.flush()
+        except OSError as e:
+            reply = QMessageBox.question(self, 'Ошибка сохранения',
+                                         f'Не удалось сохранить данные: {e}\nЗакрыть без сохранения?',
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                event.ignore()
+                return
+        # Вкладки со своим состоянием на диске (поисковый индекс ДЗ) сохраняют его сами
+        for widget in self._built.values():
+            if hasattr(widget, 'flush'):
+                widget.flush()
+        super().closeEvent(event)
 
     def _apply_styles(self):
         self.setStyleSheet("""
@@ -0,0 +1,27 @@
+import hashlib
+from collections import OrderedDict
+
+
+class MarkdownCache:
+    # HTML последних отрисованных текстов по хэшу текста. Парсер один на всех: Markdown()
+    # заново собирает все расширения, а reset() только очищает состояние после convert()
+    def __init__(self, capacity=128):
+        self.capacity = capacity
+        self._rendered = OrderedDict()
+        self._md = None
+
+    def render(self, text):
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        html = self._rendered.get(key)
+        if html is not None:
+            self._rendered.move_to_end(key)
+            return html
+        if self._md is None:
+            # markdown импортируется при первом предпросмотре, а не при запуске приложения
+            import markdown
+            self._md = markdown.Markdown()
+        html = self._md.reset().convert(text)
+        self._rendered[key] = html
+        if len(self._rendered) > self.capacity:
+            self._rendered.popitem(last=False)
+        return html
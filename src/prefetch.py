@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+from PyQt5.QtCore import QRunnable, QThreadPool
+
+
+class _Task(QRunnable):
+    def __init__(self, func, *args):
+        super().__init__()
+        self.func = func
+        self.args = args
+
+    def run(self):
+        self.func(*self.args)
+
+
+class Prefetcher:
+    # Небольшой LRU уже разрешённых недель и дней для навигации по вкладкам. После перехода
+    # соседние ключи загружаются в фоне, и следующий клик берёт данные из памяти.
+    # Ключи: ('week', понедельник) и ('day', дата), обе даты в формате YYYY-MM-DD
+    def __init__(self, data_manager, capacity=8):
+        self.data_manager = data_manager
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._loading = set()
+        self._lock = threading.Lock()
+        # Растёт при каждом изменении данных: фоновая загрузка, начатая до изменения, не попадёт в кэш
+        self._generation = 0
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        data_manager.subscribe(self._on_changed, first=True)
+
+    def get(self, key, load):
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.misses += 1
+            generation = self._generation
+        value = load()
+        self._store(key, value, generation)
+        return value
+
+    def prefetch(self, items):
+        # items: [(ключ, load)]; уже загруженные и загружаемые ключи пропускаются
+        for key, load in items:
+            with self._lock:
+                if key in self._cache or key in self._loading:
+                    continue
+                self._loading.add(key)
+                generation = self._generation
+            self.pool.start(_Task(self._load, key, load, generation))
+
+    def _load(self, key, load, generation):
+        try:
+            self._store(key, load(), generation)
+        finally:
+            with self._lock:
+                self._loading.discard(key)
+
+    def _store(self, key, value, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+
+    def _on_changed(self, resource, keys, version):
+        with self._lock:
+            if resource == 'schedule':
+                stale = list(self._cache)
+            elif resource == 'homework':
+                stale = [key for key in self._cache if key[0] == 'day' and (not keys or key[1] in keys)]
+            else:
+                return
+            for key in stale:
+                del self._cache[key]
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else None}
@@ -1,15 +1,111 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
-                            QLabel, QTableWidget, QComboBox, QHeaderView, QSizePolicy)
-from PyQt5.QtCore import QDate
+                            QLabel, QTableView, QComboBox, QHeaderView, QSizePolicy,
+                            QAbstractItemView, QStyledItemDelegate)
+from PyQt5.QtCore import Qt, QDate, QAbstractTableModel, QModelIndex, QStringListModel, QTimer
 from PyQt5.QtGui import QFont
 from .data_manager import DataManager, DAYS_OF_WEEK, MAX_LESSONS
+from .prefetch import Prefetcher
+
+
+class WeekModel(QAbstractTableModel):
+    # Строки — уроки, столбцы — дни недели (без воскресенья). Смена недели подменяет только данные
+    def __init__(self, data_manager, prefetch):
+        super().__init__()
+        self.data_manager = data_manager
+        self.prefetch = prefetch
+        self.week_start = QDate.currentDate()
+        self.dates = []
+        self.week = []
+
+    def load_week(self, week_start):
+        self.week_start = week_start
+        self.dates = [week_start.addDays(i) for i in range(len(DAYS_OF_WEEK) - 1)]
+        resolved = self.prefetch.get(*self.week_item(week_start))
+        self.week = [list(day_subjects) for day_subjects in resolved.values()]
+        self.dataChanged.emit(self.index(0, 0), self.index(MAX_LESSONS - 1, len(self.dates) - 1),
+                              [Qt.DisplayRole, Qt.EditRole])
+        self.headerDataChanged.emit(Qt.Horizontal, 0, len(self.dates) - 1)
+
+    def week_item(self, week_start):
+        # (ключ, загрузка) недели для Prefetcher
+        start = week_start.toString("yyyy-MM-dd")
+        end = week_start.addDays(len(DAYS_OF_WEEK) - 2).toString("yyyy-MM-dd")
+        return ('week', start), lambda: self.data_manager.schedule_timeline().resolve_range(start, end)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else MAX_LESSONS
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(DAYS_OF_WEEK) - 1
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            return str(section + 1)
+        if not self.dates:
+            return DAYS_OF_WEEK[section]
+        return f"{DAYS_OF_WEEK[section]}\n{self.dates[section].toString('dd.MM.yyyy')}"
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not self.week:
+            return None
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        return self.week[index.column()][index.row()]
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not self.week:
+            return False
+        row, col = index.row(), index.column()
+        if self.week[col][row] == value:
+            return False
+        self.week[col][row] = value
+        # Версия с начала текущей недели создаётся по предыдущей, если её ещё нет
+        self.data_manager.set_schedule_cell(DAYS_OF_WEEK[col], self.week_start.toString("yyyy-MM-dd"), row, value)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+
+class SubjectDelegate(QStyledItemDelegate):
+    # Все редакторы берут список предметов из одной общей модели
+    def __init__(self, subjects_model, parent=None):
+        super().__init__(parent)
+        self.subjects_model = subjects_model
+
+    def createEditor(self, parent, option, index):
+        combo = QComboBox(parent)
+        combo.setModel(self.subjects_model)
+        combo.activated.connect(lambda _: self._commit(combo))
+        QTimer.singleShot(0, combo.showPopup)
+        return combo
+
+    def _commit(self, combo):
+        combo.setProperty('picked', True)
+        self.commitData.emit(combo)
+        self.closeEditor.emit(combo)
+
+    def setEditorData(self, editor, index):
+        position = editor.findText(index.data(Qt.EditRole))
+        editor.setCurrentIndex(position if position != -1 else 0)
+
+    def setModelData(self, editor, model, index):
+        # Пишем только выбранное пользователем: уход фокуса из редактора ничего не меняет,
+        # даже если предмета клетки уже нет в списке и редактор показывает пустую строку
+        if editor.property('picked'):
+            model.setData(index, editor.currentText(), Qt.EditRole)
 
 class ScheduleTab(QWidget):
     def __init__(self, data_manager):
         super().__init__()
         self.data_manager = data_manager
-        self.schedule = self.data_manager.load_schedule()
         self.subjects = self.data_manager.load_subjects()
+        self.subjects_model = QStringListModel([""] + self.subjects)
         self.current_date = QDate.currentDate()
         self.initUI()
 
@@ -17,7 +113,12 @@ class ScheduleTab(QWidget):
         layout = QVBoxLayout()
         layout.setContentsMargins(10, 10, 10, 10)
 
-        self.table = QTableWidget(MAX_LESSONS, len(DAYS_OF_WEEK)-1)
+        self.prefetch = Prefetcher(self.data_manager)
+        self.model = WeekModel(self.data_manager, self.prefetch)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setItemDelegate(SubjectDelegate(self.subjects_model, self.table))
+        self.table.setEditTriggers(QAbstractItemView.CurrentChanged | QAbstractItemView.SelectedClicked)
         self.table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.table.verticalHeader().setDefaultSectionSize(40)
@@ -29,10 +130,8 @@ class ScheduleTab(QWidget):
 
         self._apply_styles()
 
-        self.update_headers()
         self.update_table()
 
-
     def _apply_styles(self):
         self.setStyleSheet("""
             QPushButton {
@@ -61,7 +160,7 @@ class ScheduleTab(QWidget):
                 qproperty-alignment: AlignCenter;
             }
             
-            QTableWidget {
+            QTableView {
                 font-size: 12pt;
                 background-color: #f9f9f9;
                 gridline-color: #ddd;
@@ -74,11 +173,11 @@ class ScheduleTab(QWidget):
                 background-color: #e0e0e0;
             }
             
-            QTableWidget::item {
+            QTableView::item {
                 border: 1px solid #ddd;
             }
             
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #cce8ff;
                 color: #000;
             }
@@ -133,80 +232,33 @@ class ScheduleTab(QWidget):
         start_date = self.get_current_week_start()
         return [start_date.addDays(i) for i in range(6)]
 
-    def update_headers(self):
-        dates = self.get_week_dates()
-        headers = [f"{DAYS_OF_WEEK[i]}\n{dates[i].toString('dd.MM.yyyy')}" for i in range(6)]
-        self.table.setHorizontalHeaderLabels(headers)
-
     def update_week_label(self):
         start_date = self.get_current_week_start()
         end_date = start_date.addDays(5)
         self.week_label.setText(f"{start_date.toString('dd.MM.yy')} - {end_date.toString('dd.MM.yy')}")
 
     def get_schedule_for_date(self, target_date):
-        target_date_str = target_date.toString("yyyy-MM-dd")
-        schedule = {}
-        for day in DAYS_OF_WEEK:
-            day_schedule = self.schedule.get(day, [])
-            latest_subjects = [''] * MAX_LESSONS
-            for version in sorted(day_schedule, key=lambda x: x['start_date'], reverse=True):
-                if version['start_date'] <= target_date_str:
-                    subjects = version.get('subjects', [])
-                    latest_subjects = [str(s).strip() for s in subjects[:MAX_LESSONS]] + ['']*(MAX_LESSONS - len(subjects))
-                    break
-            schedule[day] = latest_subjects
-        return schedule
+        return self.data_manager.schedule_timeline().subjects_for(target_date.toString("yyyy-MM-dd"))
 
     def update_table(self):
-        self.table.blockSignals(True)
-        self.table.clearContents()
-        self.subjects = self.data_manager.load_subjects()
-        
-        for col in range(6):
-            current_date = self.get_current_week_start().addDays(col)
-            schedule = self.get_schedule_for_date(current_date)
-            day_subjects = schedule.get(DAYS_OF_WEEK[col], [''] * MAX_LESSONS)
-            
-            for row in range(MAX_LESSONS):
-                combo = QComboBox()
-                combo.addItem("")
-                combo.addItems(self.subjects)
-                index = combo.findText(day_subjects[row])
-                combo.setCurrentIndex(index if index != -1 else 0)
-                combo.currentTextChanged.connect(lambda text, r=row, c=col: self.on_subject_changed(text, r, c))
-                self.table.setCellWidget(row, col, combo)
-        
-        self.table.blockSignals(False)
+        week_start = self.get_current_week_start()
+        self.model.load_week(week_start)
         self.update_week_label()
-
-    def on_subject_changed(self, text, row, col):
-        day = DAYS_OF_WEEK[col]
-        week_start = self.get_current_week_start().toString("yyyy-MM-dd")
-        
-        day_schedule = self.schedule.setdefault(day, [])
-        current_version = next((v for v in day_schedule if v['start_date'] == week_start), None)
-        
-        if not current_version:
-            prev_subjects = self.get_schedule_for_date(self.get_current_week_start().addDays(-1))[day]
-            current_version = {'start_date': week_start, 'subjects': prev_subjects.copy()}
-            day_schedule.append(current_version)
-        
-        if len(current_version['subjects']) <= row:
-            current_version['subjects'] += [''] * (row - len(current_version['subjects']) + 1)
-        current_version['subjects'][row] = text
-        self.data_manager.save_schedule(self.schedule)
+        # Соседние недели готовятся в фоне, пока пользователь смотрит на текущую
+        self.prefetch.prefetch([self.model.week_item(week_start.addDays(-7)),
+                                self.model.week_item(week_start.addDays(7))])
 
     def refresh_data(self):
-        self.schedule = self.data_manager.load_schedule()
         self.subjects = self.data_manager.load_subjects()
+        # Открытые редакторы видят новый список сразу: модель у них общая
+        if self.subjects_model.stringList() != [""] + self.subjects:
+            self.subjects_model.setStringList([""] + self.subjects)
         self.update_table()
 
     def prev_week(self):
         self.current_date = self.current_date.addDays(-7)
-        self.update_headers()
         self.update_table()
 
     def next_week(self):
         self.current_date = self.current_date.addDays(7)
-        self.update_headers()
         self.update_table()
@@ -0,0 +1,186 @@
+import json
+import os
+import re
+import threading
+from .storage import _atomic_write_json, homework_shard_key
+
+WORD = re.compile(r'\w+')
+
+# Окончания для грубого стемминга: сначала длинные, основа не короче трёх букв
+ENDINGS = sorted([
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ешь', 'ете', 'ите', 'ых', 'их', 'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ие', 'ые',
+    'ую', 'юю', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ию', 'ия', 'ть', 'ет', 'ют',
+    'ут', 'ит', 'ят', 'ла', 'ли', 'ло', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+
+
+def stem(word):
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    # "Задачи", "задача" и "ЗАДАЧУ" дают один терм; ё не отличается от е
+    return [stem(word) for word in WORD.findall(str(text).lower().replace('ё', 'е'))]
+
+
+class SearchIndex:
+    # Обратный индекс по тексту ДЗ: терм -> {(дата, предмет)}. Следит за хранилищем через
+    # subscribe и переиндексирует только изменившиеся дни. На диске лежат термы каждой записи
+    # по месяцам и сигнатуры файлов месяцев: при загрузке перечитываются только изменившиеся месяцы
+    def __init__(self, storage, path=None):
+        self.storage = storage
+        self.path = path or os.path.join(storage.root, 'search_index.json')
+        self._lock = threading.Lock()
+        self._docs = {}
+        self._postings = {}
+        self._dirty = False
+        # Пока индекс строится, дни из уведомлений копятся здесь и переиндексируются после сборки
+        self._touched = None
+        self._rerun = False
+        # Подписка до сборки: правки, сделанные во время неё, не теряются
+        storage.subscribe(self._on_changed)
+        self._build(self._read_saved())
+
+    def close(self):
+        self.storage.unsubscribe(self._on_changed)
+        self.save()
+
+    def _read_saved(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return saved if 'shards' in saved else {}
+
+    def rebuild(self):
+        self._build({})
+
+    def _build(self, saved):
+        with self._lock:
+            if self._touched is not None:
+                # Индекс уже строится в другом потоке: он соберёт его заново
+                self._rerun = True
+                return
+            self._touched = set()
+        try:
+            while True:
+                with self._lock:
+                    self._rerun = False
+                # Хранилище читается без self._lock: уведомления могут прийти под его блокировками
+                docs, dirty = self._collect(saved)
+                saved = {}
+                with self._lock:
+                    if self._rerun:
+                        continue
+                    touched, self._touched = self._touched, set()
+                    self._docs = {}
+                    self._postings = {}
+                    for date, entries in docs.items():
+                        if date not in touched:
+                            for subject, terms in entries.items():
+                                self._add(date, subject, terms)
+                    self._dirty = self._dirty or dirty
+                while True:
+                    days = {date: self.storage.load_homework_day(date) or {} for date in touched}
+                    with self._lock:
+                        for date, entries in days.items():
+                            self._index_day(date, entries)
+                        touched, self._touched = self._touched, set()
+                        if not touched and not self._rerun:
+                            self._touched = None
+                            return
+                    if not touched:
+                        break
+        except BaseException:
+            with self._lock:
+                self._touched = None
+            raise
+
+    def _collect(self, saved):
+        # Термы по дням: месяцы с прежней сигнатурой берутся из сохранённого индекса, остальные читаются
+        signatures = self.storage.homework_signatures()
+        shards = saved.get('shards', {})
+        docs = {}
+        stale = []
+        for key, signature in signatures.items():
+            if signature is not None and shards.get(key) == signature:
+                docs.update(saved['docs'].get(key, {}))
+            else:
+                stale.append(key)
+        for key in stale:
+            for date, subject, text in self._month_records(key):
+                terms = tokenize(text)
+                if terms:
+                    docs.setdefault(date, {})[subject] = terms
+        return docs, bool(stale) or set(shards) != set(signatures)
+
+    def _month_records(self, key):
+        if key != 'other':
+            return self.storage.iter_homework_records(f'{key}-01', f'{key}-31')
+        # Ключи не в формате даты не попадают в выборку с границами
+        return ((date, subject, text) for date, subject, text in self.storage.iter_homework_records()
+                if homework_shard_key(date) == 'other')
+
+    def _add(self, date, subject, terms):
+        terms = sorted(set(terms))
+        if not terms:
+            return
+        self._docs.setdefault(date, {})[subject] = terms
+        for term in terms:
+            self._postings.setdefault(term, set()).add((date, subject))
+
+    def _remove_day(self, date):
+        for subject, terms in self._docs.pop(date, {}).items():
+            for term in terms:
+                postings = self._postings[term]
+                postings.discard((date, subject))
+                if not postings:
+                    del self._postings[term]
+
+    def _index_day(self, date, entries):
+        self._remove_day(date)
+        for subject, text in entries.items():
+            self._add(date, subject, tokenize(text))
+        self._dirty = True
+
+    def _on_changed(self, resource, keys, version):
+        if resource != 'homework':
+            return
+        if not keys:
+            self.rebuild()
+            return
+        with self._lock:
+            if self._touched is not None:
+                self._touched.update(keys)
+                return
+        days = {date: self.storage.load_homework_day(date) or {} for date in keys}
+        with self._lock:
+            for date, entries in days.items():
+                self._index_day(date, entries)
+
+    def search(self, query, limit=50):
+        # Записи, где встречаются все термы запроса, от новых к старым
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            postings = sorted((self._postings.get(term, set()) for term in terms), key=len)
+            found = set(postings[0]).intersection(*postings[1:])
+        return sorted(found, reverse=True)[:limit]
+
+    def save(self):
+        # Сигнатуры берутся до снимка: если месяц успели изменить, при загрузке он переиндексируется
+        signatures = self.storage.homework_signatures()
+        with self._lock:
+            if not self._dirty:
+                return
+            docs = {}
+            for date, entries in self._docs.items():
+                docs.setdefault(homework_shard_key(date), {})[date] = dict(entries)
+            self._dirty = False
+        _atomic_write_json(self.path, {'shards': signatures, 'docs': docs})
@@ -0,0 +1,439 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from .storage import (Storage, ScheduleTimeline, BatchError, DAYS_OF_WEEK, MAX_LESSONS,
+                      _batch_changes, _content_hash, homework_shard_key)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subjects (
+    position INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS schedule_versions (
+    day TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    start_date TEXT NOT NULL,
+    subjects TEXT NOT NULL,
+    PRIMARY KEY (day, position)
+);
+CREATE INDEX IF NOT EXISTS schedule_versions_by_date ON schedule_versions (day, start_date);
+CREATE TABLE IF NOT EXISTS homework_days (
+    date TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS homework (
+    date TEXT NOT NULL REFERENCES homework_days (date) ON DELETE CASCADE,
+    subject TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (date, subject)
+);
+CREATE TABLE IF NOT EXISTS grade_subjects (
+    subject TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    terms INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS grade_cells (
+    subject TEXT NOT NULL REFERENCES grade_subjects (subject) ON DELETE CASCADE,
+    term INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (subject, term, idx)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# idx для четверти, которая хранится не списком, а одним значением
+SCALAR_TERM = -1
+
+
+class SqliteStorage(Storage):
+    def __init__(self, db_path='data/journal.db'):
+        # Остальные файлы (скрытые предметы, блокировки) лежат рядом с базой
+        super().__init__(root=os.path.dirname(db_path) or '.')
+        self.db_path = db_path
+        self._db_lock = threading.RLock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA foreign_keys=ON')
+        self._db.executescript(SCHEMA)
+        # Число своих коммитов; вместе с PRAGMA data_version отмечает любое изменение базы
+        self._changes = 0
+        self._versions = {}
+
+    def _transaction(self):
+        return _Transaction(self)
+
+    def _generation(self):
+        return (self._db.execute('PRAGMA data_version').fetchone()[0], self._changes)
+
+    def close(self):
+        super().close()
+        with self._db_lock:
+            self._db.close()
+
+    def load_subjects(self):
+        with self._db_lock:
+            return [name for (name,) in self._db.execute('SELECT name FROM subjects ORDER BY position')]
+
+    # Правки вида _<операция>(db, *args) выполняются внутри уже открытой транзакции;
+    # публичные методы и apply_batch отличаются только тем, сколько их в одной транзакции
+
+    def _set_subjects(self, db, data):
+        db.execute('DELETE FROM subjects')
+        db.executemany('INSERT INTO subjects (position, name) VALUES (?, ?)', enumerate(data))
+
+    def _add_subject(self, db, name):
+        if db.execute('SELECT 1 FROM subjects WHERE name = ?', (name,)).fetchone() is not None:
+            raise ValueError(f"Предмет «{name}» уже существует")
+        db.execute('INSERT INTO subjects (position, name) '
+                   'VALUES ((SELECT COALESCE(MAX(position) + 1, 0) FROM subjects), ?)', (name,))
+
+    def _remove_subject(self, db, name):
+        if not db.execute('DELETE FROM subjects WHERE name = ?', (name,)).rowcount:
+            raise ValueError(f"Предмет «{name}» не найден")
+
+    def save_subjects(self, data):
+        with self._transaction() as db:
+            self._set_subjects(db, data)
+        self._notify('subjects')
+
+    def load_schedule(self):
+        with self._db_lock:
+            rows = self._db.execute(
+                'SELECT day, start_date, subjects FROM schedule_versions ORDER BY day, position').fetchall()
+            # Как у JSON-хранилища: расписание по умолчанию — только пока его ни разу не сохраняли
+            saved = self._db.execute("SELECT 1 FROM meta WHERE key = 'schedule_saved'").fetchone() is not None
+        if not rows and not saved:
+            return {day: [{"start_date": "2024-01-01", "subjects": ['']*MAX_LESSONS}] for day in DAYS_OF_WEEK}
+        data = {}
+        for day, start_date, subjects in rows:
+            data.setdefault(day, []).append({"start_date": start_date, "subjects": json.loads(subjects)})
+        return {day: data[day] for day in sorted(data, key=_day_order)}
+
+    def save_schedule(self, data):
+        with self._transaction() as db:
+            self._set_schedule(db, data)
+        self._notify('schedule')
+
+    def _set_schedule(self, db, data):
+        rows = []
+        for day, versions in data.items():
+            if isinstance(versions, list) and all(isinstance(item, str) for item in versions):
+                versions = [{"start_date": "1970-01-01", "subjects": versions + ['']*(MAX_LESSONS - len(versions))}]
+            for position, version in enumerate(versions):
+                rows.append((day, position, version['start_date'],
+                             json.dumps(version.get('subjects', []), ensure_ascii=False)))
+        db.execute('DELETE FROM schedule_versions')
+        db.executemany(
+            'INSERT INTO schedule_versions (day, position, start_date, subjects) VALUES (?, ?, ?, ?)', rows)
+        self._mark_schedule_saved(db)
+
+    def _mark_schedule_saved(self, db):
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('schedule_saved', '1')")
+
+    def set_schedule_cell(self, day, start_date, lesson, subject):
+        with self._transaction() as db:
+            self._set_schedule_cell(db, day, start_date, lesson, subject)
+        self._notify('schedule', [day])
+
+    def _set_schedule_cell(self, db, day, start_date, lesson, subject):
+        row = db.execute('SELECT position, subjects FROM schedule_versions WHERE day = ? AND start_date = ? '
+                         'ORDER BY position LIMIT 1', (day, start_date)).fetchone()
+        if row is None:
+            previous = db.execute('SELECT subjects FROM schedule_versions WHERE day = ? AND start_date < ? '
+                                  'ORDER BY start_date DESC, position LIMIT 1', (day, start_date)).fetchone()
+            subjects = json.loads(previous[0])[:MAX_LESSONS] if previous else []
+            subjects += ['']*(MAX_LESSONS - len(subjects))
+            position = db.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM schedule_versions WHERE day = ?',
+                                  (day,)).fetchone()[0]
+        else:
+            position, subjects = row[0], json.loads(row[1])
+        subjects.extend([''] * (lesson + 1 - len(subjects)))
+        subjects[lesson] = subject
+        db.execute('INSERT OR REPLACE INTO schedule_versions (day, position, start_date, subjects) '
+                   'VALUES (?, ?, ?, ?)', (day, position, start_date, json.dumps(subjects, ensure_ascii=False)))
+        self._mark_schedule_saved(db)
+
+    def schedule_timeline(self):
+        with self._db_lock:
+            generation = self._generation()
+            if self._timeline is None or self._timeline_generation != generation:
+                self._timeline = ScheduleTimeline(self.load_schedule())
+                self._timeline_generation = generation
+            return self._timeline
+
+    def load_homework(self):
+        with self._db_lock:
+            days = [date for (date,) in self._db.execute('SELECT date FROM homework_days ORDER BY date')]
+            rows = self._db.execute('SELECT date, subject, value FROM homework ORDER BY date, position').fetchall()
+        data = {date: {} for date in days}
+        for date, subject, value in rows:
+            data[date][subject] = json.loads(value)
+        return data
+
+    def iter_homework(self, start=None, end=None, subject=None, after=None, chunk=256):
+        # Порциями по chunk дней с продолжением от последней выданной даты, без блокировки между порциями
+        bounds = []
+        if start or end:
+            # Как и в JSON-хранилище, ключи не в формате даты попадают только в выборку без границ
+            bounds.append(("date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'", None))
+        if start:
+            bounds.append(('date >= ?', start))
+        if end:
+            bounds.append(('date <= ?', end))
+        last = after
+        while True:
+            clauses = bounds + ([('date > ?', last)] if last else [])
+            where = ' AND '.join(clause for clause, _ in clauses) or '1'
+            params = [value for _, value in clauses if value is not None]
+            with self._db_lock:
+                if subject is None:
+                    dates = [date for (date,) in self._db.execute(
+                        f'SELECT date FROM homework_days WHERE {where} ORDER BY date LIMIT ?', params + [chunk])]
+                    days = {date: {} for date in dates}
+                    if dates:
+                        rows = self._db.execute(
+                            'SELECT date, subject, value FROM homework WHERE date >= ? AND date <= ? '
+                            'ORDER BY date, position', (dates[0], dates[-1]))
+                        for date, name, value in rows:
+                            days[date][name] = json.loads(value)
+                else:
+                    rows = self._db.execute(
+                        f'SELECT date, value FROM homework WHERE subject = ? AND {where} ORDER BY date LIMIT ?',
+                        [subject] + params + [chunk]).fetchall()
+                    days = {date: {subject: json.loads(value)} for date, value in rows}
+            yield from days.items()
+            if len(days) < chunk:
+                return
+            last = next(reversed(days))
+
+    def save_homework(self, data):
+        with self._transaction() as db:
+            db.execute('DELETE FROM homework_days')
+            db.executemany('INSERT INTO homework_days (date) VALUES (?)', ((date,) for date in data))
+            db.executemany(
+                'INSERT INTO homework (date, subject, position, value) VALUES (?, ?, ?, ?)',
+                ((date, subject, position, json.dumps(value, ensure_ascii=False))
+                 for date, entries in data.items()
+                 for position, (subject, value) in enumerate(entries.items())))
+        self._notify('homework')
+
+    def homework_signatures(self):
+        # Помесячных файлов нет: все месяцы получают версию всего ДЗ и изменяются вместе
+        version = self.resource_version('homework')
+        with self._db_lock:
+            dates = [date for (date,) in self._db.execute('SELECT date FROM homework_days')]
+        return {key: version for key in {homework_shard_key(date) for date in dates}}
+
+    def resource_version(self, resource):
+        if resource == 'hidden_subjects':
+            return super().resource_version(resource)
+        with self._db_lock:
+            generation = self._generation()
+            cached = self._versions.get(resource)
+            if cached is None or cached[0] != generation:
+                cached = (generation, _content_hash(getattr(self, f'load_{resource}')()))
+                self._versions[resource] = cached
+            return cached[1]
+
+    def load_homework_day(self, date):
+        with self._db_lock:
+            if self._db.execute('SELECT 1 FROM homework_days WHERE date = ?', (date,)).fetchone() is None:
+                return None
+            rows = self._db.execute('SELECT subject, value FROM homework WHERE date = ? ORDER BY position', (date,))
+            return {subject: json.loads(value) for subject, value in rows}
+
+    def save_homework_day(self, date, entries):
+        with self._transaction() as db:
+            self._set_homework_day(db, date, entries)
+        self._notify('homework', [date])
+
+    def _set_homework_day(self, db, date, entries):
+        db.execute('DELETE FROM homework_days WHERE date = ?', (date,))
+        db.execute('INSERT INTO homework_days (date) VALUES (?)', (date,))
+        db.executemany(
+            'INSERT INTO homework (date, subject, position, value) VALUES (?, ?, ?, ?)',
+            ((date, subject, position, json.dumps(value, ensure_ascii=False))
+             for position, (subject, value) in enumerate(entries.items())))
+
+    def delete_homework_day(self, date):
+        try:
+            with self._transaction() as db:
+                self._delete_homework_day(db, date)
+        except ValueError:
+            return False
+        self._notify('homework', [date])
+        return True
+
+    def _delete_homework_day(self, db, date):
+        if not db.execute('DELETE FROM homework_days WHERE date = ?', (date,)).rowcount:
+            raise ValueError(f"Нет домашнего задания на {date}")
+
+    def set_homework(self, date, subject, text):
+        with self._transaction() as db:
+            self._set_homework(db, date, subject, text)
+        self._notify('homework', [date])
+
+    def _set_homework(self, db, date, subject, text):
+        db.execute('INSERT OR IGNORE INTO homework_days (date) VALUES (?)', (date,))
+        db.execute(
+            'INSERT INTO homework (date, subject, position, value) '
+            'VALUES (?, ?, (SELECT COUNT(*) FROM homework WHERE date = ?), ?) '
+            'ON CONFLICT (date, subject) DO UPDATE SET value = excluded.value',
+            (date, subject, date, json.dumps(text, ensure_ascii=False)))
+
+    def load_grades(self):
+        with self._db_lock:
+            subjects = self._db.execute('SELECT subject, terms FROM grade_subjects ORDER BY position').fetchall()
+            cells = self._db.execute('SELECT subject, term, idx, value FROM grade_cells ORDER BY subject, term, idx')
+            data = {subject: [[] for _ in range(terms)] for subject, terms in subjects}
+            for subject, term, idx, value in cells:
+                if idx == SCALAR_TERM:
+                    data[subject][term] = json.loads(value)
+                else:
+                    data[subject][term].append(json.loads(value))
+        return data
+
+    def iter_grade_records(self):
+        # По одному предмету за запрос, чтобы не держать базу между выдачами
+        with self._db_lock:
+            subjects = [subject for (subject,) in self._db.execute(
+                'SELECT subject FROM grade_subjects ORDER BY position')]
+        for subject in subjects:
+            with self._db_lock:
+                rows = self._db.execute(
+                    'SELECT term, idx, value FROM grade_cells WHERE subject = ? ORDER BY term, idx',
+                    (subject,)).fetchall()
+            for term, idx, value in rows:
+                value = json.loads(value)
+                if value not in ('', None, []):
+                    yield subject, term, None if idx == SCALAR_TERM else idx, value
+
+    def save_grades(self, data):
+        subjects = []
+        cells = []
+        for position, (subject, grades) in enumerate(data.items()):
+            subjects.append((subject, position, len(grades)))
+            cells.extend(_grade_cells(subject, grades))
+        with self._transaction() as db:
+            db.execute('DELETE FROM grade_subjects')
+            db.executemany('INSERT INTO grade_subjects (subject, position, terms) VALUES (?, ?, ?)', subjects)
+            db.executemany('INSERT INTO grade_cells (subject, term, idx, value) VALUES (?, ?, ?, ?)', cells)
+        self._notify('grades')
+
+    def set_grade(self, subject, term, idx, value):
+        with self._transaction() as db:
+            self._set_grade(db, subject, term, idx, value)
+        self._notify('grades', [subject])
+
+    def _set_grade(self, db, subject, term, idx, value):
+        db.execute(
+            'INSERT INTO grade_subjects (subject, position, terms) '
+            'VALUES (?, (SELECT COUNT(*) FROM grade_subjects), ?) '
+            'ON CONFLICT (subject) DO UPDATE SET terms = MAX(terms, excluded.terms)',
+            (subject, max(4, term + 1)))
+        db.execute('DELETE FROM grade_cells WHERE subject = ? AND term = ? AND idx = ?',
+                   (subject, term, SCALAR_TERM))
+        filled = db.execute('SELECT COUNT(*) FROM grade_cells WHERE subject = ? AND term = ?',
+                            (subject, term)).fetchone()[0]
+        db.executemany('INSERT INTO grade_cells (subject, term, idx, value) VALUES (?, ?, ?, ?)',
+                       ((subject, term, i, '""') for i in range(filled, idx)))
+        db.execute(
+            'INSERT INTO grade_cells (subject, term, idx, value) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (subject, term, idx) DO UPDATE SET value = excluded.value',
+            (subject, term, idx, json.dumps(value, ensure_ascii=False)))
+
+    def _set_subject_grades(self, db, subject, grades):
+        db.execute(
+            'INSERT INTO grade_subjects (subject, position, terms) '
+            'VALUES (?, (SELECT COALESCE(MAX(position) + 1, 0) FROM grade_subjects), ?) '
+            'ON CONFLICT (subject) DO UPDATE SET terms = excluded.terms',
+            (subject, len(grades)))
+        db.execute('DELETE FROM grade_cells WHERE subject = ?', (subject,))
+        db.executemany('INSERT INTO grade_cells (subject, term, idx, value) VALUES (?, ?, ?, ?)',
+                       _grade_cells(subject, grades))
+
+    def _delete_subject_grades(self, db, subject):
+        if not db.execute('DELETE FROM grade_subjects WHERE subject = ?', (subject,)).rowcount:
+            raise ValueError(f"Нет оценок по предмету «{subject}»")
+
+    def apply_batch(self, operations):
+        # Весь пакет — одна транзакция SQLite: ошибка любой операции откатывает все
+        with self._transaction() as db:
+            for index, (op, args) in enumerate(operations):
+                try:
+                    getattr(self, f'_{op}')(db, *args)
+                except ValueError as e:
+                    raise BatchError(index, op, str(e)) from e
+        for resource, keys in _batch_changes(operations).items():
+            self._notify(resource, keys)
+
+
+class _Transaction:
+    def __init__(self, manager):
+        self.manager = manager
+        self.db = manager._db
+
+    def __enter__(self):
+        self.manager._db_lock.acquire()
+        try:
+            self.db.execute('BEGIN IMMEDIATE')
+        except BaseException:
+            # "database is locked" от другого процесса: блокировку нельзя оставлять занятой
+            self.manager._db_lock.release()
+            raise
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is not None:
+                self.db.execute('ROLLBACK')
+                return
+            try:
+                self.db.execute('COMMIT')
+            except BaseException:
+                # Неудачный COMMIT оставляет транзакцию открытой
+                if self.db.in_transaction:
+                    self.db.execute('ROLLBACK')
+                raise
+            self.manager._changes += 1
+        finally:
+            self.manager._db_lock.release()
+
+
+def _grade_cells(subject, grades):
+    for term, term_grades in enumerate(grades):
+        if isinstance(term_grades, list):
+            for idx, value in enumerate(term_grades):
+                yield (subject, term, idx, json.dumps(value, ensure_ascii=False))
+        else:
+            yield (subject, term, SCALAR_TERM, json.dumps(term_grades, ensure_ascii=False))
+
+
+def _day_order(day):
+    return DAYS_OF_WEEK.index(day) if day in DAYS_OF_WEEK else len(DAYS_OF_WEEK)
+
+
+def migrate_from_json(db_path='data/journal.db', source=None):
+    source = source or Storage()
+    target = SqliteStorage(db_path)
+    try:
+        with target._db_lock:
+            for table in ('subjects', 'schedule_versions', 'homework_days', 'grade_subjects'):
+                if target._db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:
+                    raise RuntimeError(f'{db_path} уже содержит данные, миграция отменена')
+        target.save_subjects(source.load_subjects())
+        target.save_schedule(source.load_schedule())
+        target.save_homework(source.load_homework())
+        target.save_grades(source.load_grades())
+    finally:
+        target.close()
+
+
+if __name__ == '__main__':
+    migrate_from_json(*sys.argv[1:2])
@@ -0,0 +1,1129 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from datetime import date as Date, timedelta
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: блокировки между процессами через msvcrt.locking (только исключительные)
+    fcntl = None
+    import msvcrt
+
+DAYS_OF_WEEK = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+MAX_LESSONS = 9
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def _clone(value):
+    # Быстрая глубокая копия для JSON-структур: вызывающий код свободно мутирует результат load_*
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clone(item) for item in value]
+    return value
+
+
+def _file_signature(stat_result):
+    return (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+
+
+def _atomic_write_json(path, data):
+    # Пишем во временный файл рядом и подменяем rename'ом: при сбое на диске остаётся старая версия
+    tmp_path, signature = _write_temp(path, data)
+    _replace(tmp_path, path)
+    return signature
+
+
+def _write_temp(path, data):
+    # Медленная часть записи: сериализация и fsync во временный файл рядом с path
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+            signature = _file_signature(os.fstat(f.fileno()))
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    return tmp_path, signature
+
+
+def _replace(tmp_path, path):
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    if os.name == 'posix':
+        dir_fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _discard(tmp_path):
+    try:
+        os.unlink(tmp_path)
+    except FileNotFoundError:
+        pass
+
+
+def _apply_set_grade(data, subject, term, idx, value):
+    terms = data.get(subject)
+    if not isinstance(terms, dict):
+        terms = data[subject] = {}
+    for i in range(max(4, term + 1)):
+        terms.setdefault(f"grade_{i}", [])
+    term_grades = terms[f"grade_{term}"]
+    if not isinstance(term_grades, list):
+        term_grades = terms[f"grade_{term}"] = []
+    term_grades.extend([''] * (idx + 1 - len(term_grades)))
+    term_grades[idx] = value
+
+
+def _apply_set_homework(data, date, subject, text):
+    entries = data.get(date)
+    if not isinstance(entries, dict):
+        entries = data[date] = {}
+    entries[subject] = text
+
+
+def _apply_set_schedule_cell(data, day, start_date, lesson, subject):
+    versions = data.get(day)
+    if not isinstance(versions, list):
+        versions = data[day] = []
+    elif versions and all(isinstance(item, str) for item in versions):
+        versions = data[day] = [{"start_date": "1970-01-01", "subjects": versions + ['']*(MAX_LESSONS - len(versions))}]
+    version = next((v for v in versions if v.get('start_date') == start_date), None)
+    if version is None:
+        # Новая версия с этой даты начинается с копии действовавшей до неё
+        previous = max((v for v in versions if v.get('start_date', '') < start_date),
+                       key=lambda v: v['start_date'], default=None)
+        subjects = list(previous.get('subjects', []))[:MAX_LESSONS] if previous else []
+        version = {"start_date": start_date, "subjects": subjects + ['']*(MAX_LESSONS - len(subjects))}
+        versions.append(version)
+    subjects = version.setdefault('subjects', [])
+    subjects.extend([''] * (lesson + 1 - len(subjects)))
+    subjects[lesson] = subject
+
+
+def _apply_set_subjects(data, subjects):
+    data[:] = subjects
+
+
+def _apply_add_subject(data, name):
+    if name in data:
+        raise ValueError(f"Предмет «{name}» уже существует")
+    data.append(name)
+
+
+def _apply_remove_subject(data, name):
+    if name not in data:
+        raise ValueError(f"Предмет «{name}» не найден")
+    data.remove(name)
+
+
+def _apply_set_homework_day(data, date, entries):
+    data[date] = dict(entries)
+
+
+def _apply_delete_homework_day(data, date):
+    if date not in data:
+        raise ValueError(f"Нет домашнего задания на {date}")
+    del data[date]
+
+
+def _apply_set_subject_grades(data, subject, grades):
+    data[subject] = {f"grade_{i}": grade for i, grade in enumerate(grades)}
+
+
+def _apply_delete_subject_grades(data, subject):
+    if subject not in data:
+        raise ValueError(f"Нет оценок по предмету «{subject}»")
+    del data[subject]
+
+
+def _apply_set_schedule(data, schedule):
+    data.clear()
+    data.update(schedule)
+
+
+# Точечные правки; для оценок и ДЗ в режиме журнала они пишутся в лог вместо перезаписи JSON.
+# Все они работают с форматом файла на диске и годятся для apply_batch
+MUTATIONS = {
+    'set_grade': _apply_set_grade,
+    'set_homework': _apply_set_homework,
+    'set_schedule_cell': _apply_set_schedule_cell,
+    'set_subjects': _apply_set_subjects,
+    'add_subject': _apply_add_subject,
+    'remove_subject': _apply_remove_subject,
+    'set_homework_day': _apply_set_homework_day,
+    'delete_homework_day': _apply_delete_homework_day,
+    'set_subject_grades': _apply_set_subject_grades,
+    'delete_subject_grades': _apply_delete_subject_grades,
+    'set_schedule': _apply_set_schedule,
+}
+
+# Ресурс, который меняет операция; для homework файл выбирается по дате из первого аргумента
+MUTATION_RESOURCES = {
+    'set_grade': 'grades',
+    'set_homework': 'homework',
+    'set_schedule_cell': 'schedule',
+    'set_subjects': 'subjects',
+    'add_subject': 'subjects',
+    'remove_subject': 'subjects',
+    'set_homework_day': 'homework',
+    'delete_homework_day': 'homework',
+    'set_subject_grades': 'grades',
+    'delete_subject_grades': 'grades',
+    'set_schedule': 'schedule',
+}
+
+
+# Операции, которые переписывают ресурс целиком, а не один ключ (первый аргумент)
+WHOLE_MUTATIONS = {'set_subjects', 'set_schedule'}
+
+
+def _batch_changes(operations):
+    # {ресурс: изменённые ключи} для наблюдателей; пустой список — ресурс изменён целиком
+    changes = {}
+    whole = set()
+    for op, args in operations:
+        resource = MUTATION_RESOURCES[op]
+        keys = changes.setdefault(resource, [])
+        if op in WHOLE_MUTATIONS:
+            whole.add(resource)
+        elif args[0] not in keys:
+            keys.append(args[0])
+    return {resource: [] if resource in whole else keys for resource, keys in sorted(changes.items())}
+
+
+class BatchError(Exception):
+    # Операция пакета не применима к текущим данным; пакет целиком отменён
+    def __init__(self, index, op, message):
+        super().__init__(message)
+        self.index = index
+        self.op = op
+
+
+def homework_shard_key(date):
+    # ДЗ хранится помесячно: data/homework/2025-03.json; ключи не в формате даты попадают в other.json
+    return date[:7] if DATE_PATTERN.fullmatch(date) else 'other'
+
+
+def _content_hash(data):
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+
+def _as_date(value):
+    return value if isinstance(value, Date) else Date.fromisoformat(value)
+
+
+class ScheduleTimeline:
+    # Версии расписания каждого дня недели, отсортированные один раз; поиск по дате — бинарный
+    def __init__(self, schedule):
+        self._days = {}
+        for day in DAYS_OF_WEEK:
+            starts, lessons = [], []
+            for version in sorted(schedule.get(day, []), key=lambda x: x['start_date']):
+                subjects = version.get('subjects', [])
+                subjects = [str(s).strip() for s in subjects[:MAX_LESSONS]] + ['']*(MAX_LESSONS - len(subjects))
+                if starts and starts[-1] == version['start_date']:
+                    continue
+                starts.append(version['start_date'])
+                lessons.append(subjects)
+            self._days[day] = (starts, lessons)
+
+    def day_subjects(self, day, date):
+        starts, lessons = self._days[day]
+        index = bisect_right(starts, str(date))
+        return list(lessons[index - 1]) if index else [''] * MAX_LESSONS
+
+    def subjects_for(self, date):
+        return {day: self.day_subjects(day, date) for day in DAYS_OF_WEEK}
+
+    def resolve_range(self, start, end):
+        # {дата: предметы её дня недели} для всех дат отрезка за один проход
+        current, end = _as_date(start), _as_date(end)
+        positions = {}
+        result = {}
+        while current <= end:
+            date_str = current.isoformat()
+            day = DAYS_OF_WEEK[current.weekday()]
+            starts, lessons = self._days[day]
+            index = positions[day] if day in positions else bisect_right(starts, date_str)
+            while index < len(starts) and starts[index] <= date_str:
+                index += 1
+            positions[day] = index
+            result[date_str] = list(lessons[index - 1]) if index else [''] * MAX_LESSONS
+            current += timedelta(days=1)
+        return result
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK сдаётся примерно через 10 секунд попыток; ждём, как flock
+            pass
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _ResourceLock:
+    # Реентерабельная блокировка ресурса: threading.RLock внутри процесса и блокировка файла
+    # (flock, на Windows msvcrt.locking) между процессами
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, 'a')
+                _lock_file(self._file)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            try:
+                _unlock_file(self._file)
+            finally:
+                self._file.close()
+                self._file = None
+        self._lock.release()
+
+
+def _claim_root(path, exclusive):
+    # Кто работает с каталогом журнала: обычные хранилища держат на path общую flock-блокировку,
+    # хранилище в режиме журнала — исключительную. Его правки до compact() лежат только в mutations.log
+    # и в памяти, поэтому делить с ним каталог нельзя ни другому процессу, ни второму хранилищу
+    if fcntl is None:
+        # msvcrt.locking не умеет общих блокировок, и проверить, что каталог ни с кем не делится, нечем
+        if exclusive:
+            raise RuntimeError("Режим журнала недоступен: на этой системе нет общих блокировок файлов (flock)")
+        return None
+    f = open(path, 'a')
+    try:
+        fcntl.flock(f.fileno(), (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        if exclusive:
+            raise RuntimeError(f"Режим журнала недоступен: каталог {os.path.dirname(path)} открыт другим хранилищем")
+        raise RuntimeError(f"Каталог {os.path.dirname(path)} открыт другим хранилищем в режиме журнала")
+    return f
+
+
+class Storage:
+    # Хранилище журнала без Qt: им пользуется api.py, а DataManager (data_manager.py) оборачивает его
+    # для виджетов и переизлучает уведомления как сигналы
+    def __init__(self, root='data', write_delay=0, journal_mode=False, compact_threshold=256 * 1024,
+                 resident_shards=12):
+        # Каталог одного журнала; api.py держит по хранилищу на каждый открытый журнал школы
+        self.root = root
+        self.schedule_file = os.path.join(root, 'schedule.json')
+        self.homework_file = os.path.join(root, 'homework.json')
+        self.homework_dir = os.path.join(root, 'homework')
+        self.subjects_file = os.path.join(root, 'subjects.json')
+        self.grades_file = os.path.join(root, 'grades.json')
+        self.hidden_subjects_file = os.path.join(root, 'hidden_subjects.json')
+        self.log_file = os.path.join(root, 'mutations.log')
+        self.lock_dir = root
+        # Порядок захвата: блокировки ресурсов (по имени) -> _cache_lock, никогда наоборот
+        self._resource_locks = {}
+        self._resource_locks_guard = threading.Lock()
+        # path -> (сигнатура файла, разобранный JSON); сверяется с mtime/size при каждом чтении
+        self._cache = {}
+        self._cache_lock = threading.RLock()
+        # Счётчик изменений содержимого по каждому файлу
+        self._generations = {}
+        self._digests = {}
+        self._timeline = None
+        self._timeline_generation = None
+        # Сохранения в пределах write_delay секунд склеиваются в одну запись на файл
+        self.write_delay = write_delay
+        self._pending = {}
+        self._flush_timer = None
+        # Данные, которые сейчас пишет фоновая запись (_write_behind), и поколение файла,
+        # последним попавшее на диск: более старая запись не затирает более новую
+        self._writing = {}
+        self._committed = {}
+        # Правки, ждущие записи: path -> [сигнатура файла, от которого они отсчитаны, [(op, args)]].
+        # Если другой процесс успел переписать файл, перед записью они применяются к его версии.
+        # None — ждёт запись файла целиком (_write_json), она не пересчитывается
+        self._ops = {}
+        self._writing_ops = {}
+        # Режим журнала: правки оценок и ДЗ дописываются в log_file, JSON-снимки обновляет compact().
+        # Каталог при этом принадлежит одному хранилищу, см. _claim_root
+        self.journal_mode = journal_mode
+        self._root_claim = None
+        if journal_mode or os.path.isdir(root):
+            self._root_claim = _claim_root(os.path.join(root, '.journal.lock'), journal_mode)
+        self.compact_threshold = compact_threshold
+        self._dirty = {}
+        self._mutation_seq = 0
+        self._log = None
+        self._compact_lock = threading.Lock()
+        # LRU месяцев ДЗ, держащихся в кэше
+        self.resident_shards = resident_shards
+        self._shard_lru = OrderedDict()
+        self._homework_migrated = False
+        # Наблюдатели изменений: callback(ресурс, изменённые ключи — предметы или даты, номер версии);
+        # пустой список ключей — изменился весь ресурс. Вызываются в потоке, который сделал изменение
+        self._observers = []
+        self._change_seq = itertools.count(1)
+        # Отсортированные даты каждого месяца ДЗ: path -> (поколение, [даты])
+        self._date_index = {}
+        if journal_mode:
+            self._replay_log()
+
+    def _cached(self, path):
+        # Живой объект из кэша: только под _cache_lock и без передачи наружу
+        if path in self._pending:
+            return self._pending[path]
+        if path in self._writing:
+            return self._writing[path]
+        if path in self._dirty:
+            return self._cache[path][1]
+        if os.path.dirname(path) == self.homework_dir:
+            self._migrate_homework()
+        try:
+            signature = _file_signature(os.stat(path))
+        except FileNotFoundError:
+            if self._cache.pop(path, None) is not None:
+                self._bump(path)
+            raise
+        entry = self._cache.get(path)
+        if entry is None or entry[0] != signature:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            entry = (signature, data)
+            self._cache[path] = entry
+            self._bump(path)
+        self._touch_shard(path)
+        return entry[1]
+
+    def _bump(self, path):
+        self._generations[path] = self._generations.get(path, 0) + 1
+
+    def _touch_shard(self, path):
+        if os.path.dirname(path) != self.homework_dir:
+            return
+        self._shard_lru[path] = None
+        self._shard_lru.move_to_end(path)
+        for resident in list(self._shard_lru):
+            if len(self._shard_lru) <= self.resident_shards:
+                break
+            if resident != path and resident not in self._pending and resident not in self._dirty:
+                del self._shard_lru[resident]
+                self._cache.pop(resident, None)
+                self._date_index.pop(resident, None)
+
+    def _read_json(self, path):
+        with self._cache_lock:
+            return _clone(self._cached(path))
+
+    def _resource_of(self, path):
+        if os.path.dirname(path) == self.homework_dir:
+            return 'homework'
+        return {
+            self.subjects_file: 'subjects',
+            self.schedule_file: 'schedule',
+            self.grades_file: 'grades',
+            self.hidden_subjects_file: 'hidden_subjects',
+        }[path]
+
+    def _locked(self, resource):
+        with self._resource_locks_guard:
+            lock = self._resource_locks.get(resource)
+            if lock is None:
+                lock = self._resource_locks[resource] = _ResourceLock(os.path.join(self.lock_dir, f'.{resource}.lock'))
+        return lock
+
+    @contextmanager
+    def transaction(self, *resources):
+        # Держит блокировки ресурсов на всё чтение-изменение-запись; на выходе записи уже на диске
+        with ExitStack() as stack:
+            for resource in sorted(set(resources)):
+                stack.enter_context(self._locked(resource))
+            yield self
+            self._flush_pending([path for path in list(self._pending) + list(self._writing)
+                                 if self._resource_of(path) in resources])
+
+    def _write_json(self, path, data):
+        with self._locked(self._resource_of(path)):
+            with self._cache_lock:
+                resource = self._journaled_resource(path)
+                if resource is not None:
+                    data = _clone(data)
+                    self._journal(path, data, {'op': 'replace', 'file': resource, 'data': data})
+                    return
+                self._ops[path] = None
+                self._stage(path, _clone(data))
+            self._flush_staged(path)
+
+    def _stage(self, path, data):
+        # data уже принадлежит хранилищу; под блокировкой ресурса и _cache_lock
+        self._pending[path] = data
+        self._bump(path)
+        if self.write_delay > 0:
+            self._schedule_flush()
+
+    def _flush_staged(self, path):
+        # Под блокировкой ресурса, но уже без _cache_lock: сериализация и fsync не задерживают
+        # чтение остальных ресурсов
+        if self.write_delay <= 0:
+            self._flush_pending([path])
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.write_delay, self._flush_pending)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_pending(self, paths=None):
+        if paths is None:
+            with self._cache_lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                paths = list(self._pending) + [path for path in self._writing if path not in self._pending]
+        for path in paths:
+            # Данные файла меняются только под блокировкой его ресурса, поэтому пишутся без _cache_lock:
+            # он нужен лишь, чтобы забрать их и подменить запись в кэше
+            with self._locked(self._resource_of(path)):
+                with self._cache_lock:
+                    # Идущую фоновую запись не ждём: её данные пишутся здесь же, а она сама потом отменится
+                    if path in self._pending:
+                        data, entry = self._pending[path], self._ops.get(path)
+                    elif path in self._writing:
+                        data, entry = self._writing[path], self._writing_ops.get(path)
+                    else:
+                        continue
+                rebased = self._rebase(path, entry)
+                if rebased is not None:
+                    data = rebased
+                    with self._cache_lock:
+                        self._pending[path] = data
+                signature = _atomic_write_json(path, data)
+                with self._cache_lock:
+                    self._pending.pop(path, None)
+                    self._ops.pop(path, None)
+                    self._committed[path] = self._generations.get(path, 0)
+                    self._cache[path] = (signature, data)
+                    self._touch_shard(path)
+
+    def _rebase(self, path, entry):
+        # Под блокировкой ресурса. Если файл на диске уже не тот, от которого отсчитаны правки
+        # (его записал другой процесс), возвращает его версию с этими правками поверх, иначе None
+        if entry is None:
+            return None
+        try:
+            signature = _file_signature(os.stat(path))
+        except FileNotFoundError:
+            signature = None
+        if signature == entry[0]:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = [] if path == self.subjects_file else {}
+        for op, args in entry[1]:
+            try:
+                MUTATIONS[op](data, *args)
+            except ValueError:
+                # Та же правка уже есть на диске (предмет добавлен, день удалён)
+                pass
+        with self._cache_lock:
+            self._bump(path)
+        return data
+
+    def _write_behind(self, path):
+        # Запись одного файла из фонового потока. Сериализация и fsync идут без блокировок, и правки
+        # в это время не ждут диск; подмена файла — под блокировкой ресурса, _cache_lock берётся
+        # только на перестановку данных. Вызывающий не запускает две такие записи одного файла одновременно
+        with self._locked(self._resource_of(path)):
+            with self._cache_lock:
+                data = self._pending.pop(path, None)
+                if data is None:
+                    return
+                entry = self._ops.pop(path, None)
+                self._writing[path] = data
+                self._writing_ops[path] = entry
+            rebased = self._rebase(path, entry)
+            with self._cache_lock:
+                if rebased is not None:
+                    data = self._writing[path] = rebased
+                    entry = self._writing_ops[path] = [_file_signature(os.stat(path)), entry[1]]
+                generation = self._generations.get(path, 0)
+        try:
+            tmp_path, signature = _write_temp(path, data)
+            with self._locked(self._resource_of(path)):
+                with self._cache_lock:
+                    superseded = self._committed.get(path, -1) >= generation
+                if superseded:
+                    _discard(tmp_path)
+                else:
+                    rebased = self._rebase(path, entry)
+                    if rebased is None:
+                        _replace(tmp_path, path)
+                    else:
+                        # Файл переписали, пока шла запись: повторяем её под блокировкой
+                        _discard(tmp_path)
+                        data = rebased
+                        signature = _atomic_write_json(path, data)
+                with self._cache_lock:
+                    if not superseded:
+                        pending = self._ops.get(path)
+                        if rebased is None and pending is not None and entry is not None:
+                            # Правки, пришедшие во время записи, отсчитаны от только что записанных данных
+                            pending[0] = signature
+                            del pending[1][:len(entry[1])]
+                        self._committed[path] = generation
+                        self._cache[path] = (signature, data)
+                        self._touch_shard(path)
+                    del self._writing[path]
+                    self._writing_ops.pop(path, None)
+        except BaseException:
+            # Данные не теряются: если новее ничего не появилось, они снова ждут записи
+            with self._locked(self._resource_of(path)), self._cache_lock:
+                self._writing.pop(path, None)
+                self._writing_ops.pop(path, None)
+                if self._committed.get(path, -1) < generation and path not in self._pending:
+                    self._pending[path] = data
+                    self._ops[path] = entry
+            raise
+
+    def subscribe(self, callback, first=False):
+        # first=True — для кэшей поверх хранилища: они сбрасываются раньше, чем остальные
+        # подписчики (сигналы вкладок) успеют перечитать данные
+        if first:
+            self._observers.insert(0, callback)
+        else:
+            self._observers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._observers.remove(callback)
+
+    def _notify(self, resource, keys=()):
+        version = next(self._change_seq)
+        for callback in list(self._observers):
+            callback(resource, list(keys), version)
+
+    def _mutation_path(self, op, args):
+        resource = MUTATION_RESOURCES[op]
+        if resource == 'homework':
+            return self._shard_path(homework_shard_key(args[0]))
+        return getattr(self, f'{resource}_file')
+
+    def apply_batch(self, operations):
+        # operations: [(op, args), ...]. Все правки применяются к копиям в памяти, и только если
+        # ни одна не упала, каждый затронутый файл записывается один раз
+        resources = sorted({MUTATION_RESOURCES[op] for op, _ in operations})
+        with self.transaction(*resources):
+            if 'homework' in resources:
+                with self._cache_lock:
+                    self._migrate_homework()
+            # Отложенные правки этих ресурсов сначала уходят на диск (с пересчётом поверх чужих записей),
+            # и пакет читает уже то, что лежит в файлах
+            self._flush_pending([path for path in list(self._pending) + list(self._writing)
+                                 if self._resource_of(path) in resources])
+            staged = {}
+            for index, (op, args) in enumerate(operations):
+                path = self._mutation_path(op, args)
+                if path not in staged:
+                    try:
+                        staged[path] = self._read_json(path)
+                    except (FileNotFoundError, json.JSONDecodeError):
+                        staged[path] = [] if path == self.subjects_file else {}
+                try:
+                    MUTATIONS[op](staged[path], *args)
+                except ValueError as e:
+                    raise BatchError(index, op, str(e)) from e
+            journaled = {path for path in staged if self._journaled_resource(path) is not None}
+            self._commit_files({path: data for path, data in staged.items() if path not in journaled})
+            for path in journaled:
+                self._write_json(path, staged[path])
+        for resource, keys in _batch_changes(operations).items():
+            self._notify(resource, keys)
+
+    def _commit_files(self, files):
+        # Под блокировками ресурсов: сначала все временные файлы, и только когда записаны все, — подмены.
+        # Ошибка записи (нет места на диске) не оставляет на диске часть пакета; упасть между
+        # подменами может только сам rename
+        temps = {}
+        try:
+            for path, data in files.items():
+                temps[path] = _write_temp(path, data)
+            for path in list(temps):
+                tmp_path, signature = temps.pop(path)
+                _replace(tmp_path, path)
+                with self._cache_lock:
+                    self._pending.pop(path, None)
+                    self._ops.pop(path, None)
+                    self._bump(path)
+                    self._committed[path] = self._generations.get(path, 0)
+                    self._cache[path] = (signature, files[path])
+                    self._touch_shard(path)
+        finally:
+            for tmp_path, _ in temps.values():
+                _discard(tmp_path)
+
+    def flush(self):
+        self._flush_pending()
+        if self.journal_mode:
+            self.compact()
+
+    def close(self):
+        # Всё несохранённое записывается, каталог журнала освобождается для других хранилищ
+        self.flush()
+        with self._cache_lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if self._root_claim is not None:
+                self._root_claim.close()
+                self._root_claim = None
+
+    def _journaled_resource(self, path):
+        if self.journal_mode:
+            if path == self.grades_file:
+                return 'grades'
+            if os.path.dirname(path) == self.homework_dir:
+                return 'homework/' + os.path.basename(path)[:-len('.json')]
+        return None
+
+    def _resource_path(self, resource):
+        if resource == 'grades':
+            return self.grades_file
+        return self._shard_path(resource.split('/', 1)[1])
+
+    def _mutable(self, path):
+        try:
+            return self._cached(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+            self._cache[path] = (None, data)
+            return data
+
+    def _mark_dirty(self, path, data):
+        self._mutation_seq += 1
+        self._dirty[path] = self._mutation_seq
+        self._cache[path] = (None, data)
+        self._bump(path)
+        self._touch_shard(path)
+
+    def _journal(self, path, data, record):
+        self._mark_dirty(path, data)
+        self._log.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        if os.fstat(self._log.fileno()).st_size >= self.compact_threshold and not self._compact_lock.locked():
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def _mutate(self, op, path, *args):
+        apply = MUTATIONS[op]
+        with self._locked(self._resource_of(path)):
+            with self._cache_lock:
+                if self._journaled_resource(path) is not None:
+                    data = self._mutable(path)
+                    apply(data, *args)
+                    self._journal(path, data, {'op': op, 'file': self._journaled_resource(path), 'args': list(args)})
+                    return
+                # Отложенная запись уже держит собственную копию файла: правка ложится прямо в неё,
+                # и копируется файл не чаще одного раза за период write_delay
+                data = self._pending.get(path)
+                entry = self._ops.get(path)
+                if data is None:
+                    if path in self._writing:
+                        # Отсчёт от данных идущей фоновой записи вместе с её правками
+                        entry = self._writing_ops.get(path)
+                        entry = None if entry is None else [entry[0], list(entry[1])]
+                    else:
+                        entry = [None, []]
+                    try:
+                        data = self._read_json(path)
+                    except (FileNotFoundError, json.JSONDecodeError):
+                        data = {}
+                    if entry is not None and path not in self._writing:
+                        cached = self._cache.get(path)
+                        entry[0] = cached[0] if cached is not None else None
+                apply(data, *args)
+                if entry is not None:
+                    entry[1].append((op, list(args)))
+                self._ops[path] = entry
+                self._stage(path, data)
+            self._flush_staged(path)
+
+    def _replay_log(self):
+        replayed = False
+        for log_path in (self.log_file + '.old', self.log_file):
+            try:
+                f = open(log_path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            with f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Оборванная при сбое последняя запись
+                        continue
+                    path = self._resource_path(record['file'])
+                    if record['op'] == 'replace':
+                        data = record['data']
+                    else:
+                        data = self._mutable(path)
+                        MUTATIONS[record['op']](data, *record['args'])
+                    self._mark_dirty(path, data)
+                    replayed = True
+        if replayed:
+            self.compact()
+        else:
+            self._log = open(self.log_file, 'a', encoding='utf-8')
+
+    def compact(self):
+        old_log = self.log_file + '.old'
+        with self._compact_lock:
+            with self._cache_lock:
+                snapshots = {path: (seq, _clone(self._cache[path][1])) for path, seq in self._dirty.items()}
+                if self._log is not None:
+                    self._log.close()
+                if os.path.exists(self.log_file):
+                    if os.path.exists(old_log):
+                        with open(old_log, 'a', encoding='utf-8') as dst, open(self.log_file, 'r', encoding='utf-8') as src:
+                            dst.write(src.read())
+                        os.remove(self.log_file)
+                    else:
+                        os.replace(self.log_file, old_log)
+                self._log = open(self.log_file, 'a', encoding='utf-8')
+            for path, (seq, data) in snapshots.items():
+                with self._locked(self._resource_of(path)):
+                    signature = _atomic_write_json(path, data)
+                    with self._cache_lock:
+                        if self._dirty.get(path) == seq:
+                            del self._dirty[path]
+                            self._cache[path] = (signature, self._cache[path][1])
+            if os.path.exists(old_log):
+                os.remove(old_log)
+
+    def _digest(self, path):
+        # Хэш содержимого файла, одинаковый во всех процессах. Для файла без несохранённых изменений
+        # он привязан к сигнатуре файла и проверяется одним stat, без чтения и разбора
+        with self._cache_lock:
+            if path in self._pending or path in self._writing or path in self._dirty:
+                key = ('generation', self._generations.get(path, 0))
+            else:
+                try:
+                    key = _file_signature(os.stat(path))
+                except FileNotFoundError:
+                    key = None
+            cached = self._digests.get(path)
+            if cached is None or cached[0] != key:
+                try:
+                    data = self._cached(path)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    data = None
+                cached = (key, _content_hash(data))
+                self._digests[path] = cached
+            return cached[1]
+
+    def resource_version(self, resource):
+        if resource == 'homework':
+            digest = hashlib.blake2b(digest_size=8)
+            for key in self.homework_months():
+                digest.update(f'{key}:{self._digest(self._shard_path(key))};'.encode())
+            return digest.hexdigest()
+        return self._digest(getattr(self, f'{resource}_file'))
+
+    def load_subjects(self):
+        try:
+            return self._read_json(self.subjects_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+    
+    def save_subjects(self, data):
+        self._write_json(self.subjects_file, data)
+        self._notify('subjects')
+
+    def load_schedule(self):
+        try:
+            data = self._read_json(self.schedule_file)
+            for day in DAYS_OF_WEEK:
+                if day in data and isinstance(data[day], list):
+                    if all(isinstance(item, str) for item in data[day]):
+                        data[day] = [{
+                            "start_date": "1970-01-01",
+                            "subjects": data[day] + ['']*(MAX_LESSONS - len(data[day]))
+                        }]
+            return data
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {day: [{"start_date": "2024-01-01", "subjects": ['']*MAX_LESSONS}] for day in DAYS_OF_WEEK}
+
+    def save_schedule(self, data):
+        self._write_json(self.schedule_file, data)
+        self._notify('schedule')
+
+    def set_schedule_cell(self, day, start_date, lesson, subject):
+        self._mutate('set_schedule_cell', self.schedule_file, day, start_date, lesson, subject)
+        self._notify('schedule', [day])
+
+    def schedule_timeline(self):
+        with self._cache_lock:
+            try:
+                self._cached(self.schedule_file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+            generation = self._generations.get(self.schedule_file, 0)
+            if self._timeline is None or self._timeline_generation != generation:
+                self._timeline = ScheduleTimeline(self.load_schedule())
+                self._timeline_generation = generation
+            return self._timeline
+
+    def _shard_path(self, key):
+        return os.path.join(self.homework_dir, f'{key}.json')
+
+    def _migrate_homework(self):
+        # Разовый перенос homework.json в помесячные файлы; старый файл остаётся как homework.json.bak
+        if self._homework_migrated or os.path.isdir(self.homework_dir):
+            self._homework_migrated = True
+            return
+        shards = {}
+        try:
+            with open(self.homework_file, 'r', encoding='utf-8') as f:
+                for date, entries in json.load(f).items():
+                    shards.setdefault(homework_shard_key(date), {})[date] = entries
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        # Собираем месяцы во временном каталоге и переименовываем его целиком: если другой процесс
+        # успел раньше, rename упадёт и наша копия просто удаляется
+        parent = os.path.dirname(self.homework_dir) or '.'
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=f'.{os.path.basename(self.homework_dir)}.')
+        try:
+            for key, data in shards.items():
+                _atomic_write_json(os.path.join(tmp_dir, f'{key}.json'), data)
+            os.rename(tmp_dir, self.homework_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(self.homework_dir):
+                raise
+        try:
+            os.replace(self.homework_file, self.homework_file + '.bak')
+        except FileNotFoundError:
+            pass
+        self._homework_migrated = True
+
+    def homework_months(self):
+        with self._cache_lock:
+            self._migrate_homework()
+            names = set(os.listdir(self.homework_dir))
+            names.update(os.path.basename(path) for path in list(self._pending) + list(self._writing) + list(self._dirty)
+                         if os.path.dirname(path) == self.homework_dir)
+        return sorted(name[:-len('.json')] for name in names if name.endswith('.json'))
+
+    def homework_signatures(self):
+        # Сигнатура файла каждого месяца; None, если в нём есть незаписанные правки.
+        # По ним поисковый индекс узнаёт изменившиеся месяцы, не читая остальные
+        keys = self.homework_months()
+        signatures = {}
+        with self._cache_lock:
+            for key in keys:
+                path = self._shard_path(key)
+                signatures[key] = None
+                if path not in self._pending and path not in self._writing and path not in self._dirty:
+                    try:
+                        signatures[key] = list(_file_signature(os.stat(path)))
+                    except FileNotFoundError:
+                        pass
+        return signatures
+
+    def _load_shard(self, key):
+        try:
+            return self._read_json(self._shard_path(key))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def load_homework(self):
+        # Полный обход всех месяцев; для одного дня есть load_homework_day
+        data = {}
+        for key in self.homework_months():
+            data.update(self._load_shard(key))
+        return data
+
+    def _shard_dates(self, path):
+        # Только под _cache_lock; индекс пересобирается, когда меняется поколение файла
+        shard = self._cached(path)
+        generation = self._generations.get(path, 0)
+        entry = self._date_index.get(path)
+        if entry is None or entry[0] != generation:
+            entry = self._date_index[path] = (generation, sorted(shard))
+        return entry[1], shard
+
+    def iter_homework(self, start=None, end=None, subject=None, after=None):
+        # Дни по возрастанию даты: start <= дата <= end и дата > after (курсор постраничной выдачи).
+        # Месяцы читаются по одному, блокировка между ними отпускается
+        for key in self.homework_months():
+            if key == 'other':
+                # Ключи не в формате даты попадают только в выборку без границ
+                if start or end:
+                    continue
+            elif (start and key < start[:7]) or (after and key < after[:7]) or (end and key > end[:7]):
+                continue
+            with self._cache_lock:
+                try:
+                    dates, shard = self._shard_dates(self._shard_path(key))
+                except (FileNotFoundError, json.JSONDecodeError):
+                    continue
+                lo = bisect_left(dates, start) if start else 0
+                if after:
+                    lo = max(lo, bisect_right(dates, after))
+                hi = bisect_right(dates, end) if end else len(dates)
+                if subject is None:
+                    days = [(date, _clone(shard[date])) for date in dates[lo:hi]]
+                else:
+                    days = [(date, {subject: _clone(shard[date][subject])})
+                            for date in dates[lo:hi] if subject in shard[date]]
+            yield from days
+
+    def iter_homework_records(self, start=None, end=None, subject=None):
+        # По записи (дата, предмет, текст) для выгрузки; данные читаются по месяцу за раз
+        for date, entries in self.iter_homework(start, end, subject):
+            for name, text in entries.items():
+                yield date, name, text
+
+    def load_homework_day(self, date):
+        with self._cache_lock:
+            try:
+                entries = self._cached(self._shard_path(homework_shard_key(date))).get(date)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+            return _clone(entries)
+
+    def save_homework(self, data):
+        with self._locked('homework'):
+            shards = {key: {} for key in self.homework_months()}
+            for date, entries in data.items():
+                shards.setdefault(homework_shard_key(date), {})[date] = entries
+            changed = set()
+            for key, shard in shards.items():
+                previous = self._load_shard(key)
+                if shard != previous:
+                    changed.update(date for date in shard.keys() | previous.keys()
+                                   if shard.get(date) != previous.get(date))
+                    self._write_json(self._shard_path(key), shard)
+        if changed:
+            self._notify('homework', sorted(changed))
+
+    def save_homework_day(self, date, entries):
+        with self._locked('homework'):
+            shard = self._load_shard(homework_shard_key(date))
+            shard[date] = entries
+            self._write_json(self._shard_path(homework_shard_key(date)), shard)
+        self._notify('homework', [date])
+
+    def delete_homework_day(self, date):
+        with self._locked('homework'):
+            shard = self._load_shard(homework_shard_key(date))
+            if shard.pop(date, None) is None:
+                return False
+            self._write_json(self._shard_path(homework_shard_key(date)), shard)
+        self._notify('homework', [date])
+        return True
+
+    def set_homework(self, date, subject, text):
+        with self._locked('homework'):
+            self._migrate_homework()
+            self._mutate('set_homework', self._shard_path(homework_shard_key(date)), date, subject, text)
+        self._notify('homework', [date])
+    
+    def load_grades(self):
+        try:
+            data = self._read_json(self.grades_file)
+            return {subject: list(grades.values()) for subject, grades in data.items()}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def iter_grade_records(self):
+        # По записи (предмет, четверть, номер, оценка) для выгрузки, пустые клетки пропускаются.
+        # Копируется один предмет за раз; у четверти, хранящейся одним значением, номер None
+        with self._cache_lock:
+            try:
+                subjects = list(self._cached(self.grades_file))
+            except (FileNotFoundError, json.JSONDecodeError):
+                return
+        for subject in subjects:
+            with self._cache_lock:
+                try:
+                    terms = _clone(self._cached(self.grades_file).get(subject))
+                except (FileNotFoundError, json.JSONDecodeError):
+                    return
+            if not isinstance(terms, dict):
+                continue
+            for term, grades in enumerate(terms.values()):
+                if not isinstance(grades, list):
+                    if grades not in ('', None, []):
+                        yield subject, term, None, grades
+                    continue
+                for idx, value in enumerate(grades):
+                    if value != '':
+                        yield subject, term, idx, value
+
+    def save_grades(self, data):
+        formatted_data = {subject: {f"grade_{i}": grade for i, grade in enumerate(grades)} 
+                        for subject, grades in data.items()}
+        self._write_json(self.grades_file, formatted_data)
+        self._notify('grades')
+
+    def set_grade(self, subject, term, idx, value):
+        self._mutate('set_grade', self.grades_file, subject, term, idx, value)
+        self._notify('grades', [subject])
+
+    def load_hidden_subjects(self):
+        try:
+            return self._read_json(self.hidden_subjects_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def save_hidden_subjects(self, hidden_subjects):
+        self._write_json(self.hidden_subjects_file, hidden_subjects)
@@ -0,0 +1,199 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+import src.storage
+from src.storage import Storage, BatchError, DAYS_OF_WEEK, MAX_LESSONS
+from src.sqlite_data_manager import SqliteStorage, migrate_from_json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Оба хранилища обязаны одинаково выполнять контракт load_*/save_* и точечных правок
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'json':
+        storage = Storage(root=str(tmp_path))
+    else:
+        storage = SqliteStorage(str(tmp_path / 'journal.db'))
+    yield storage
+    storage.close()
+
+
+def test_defaults(storage):
+    assert storage.load_subjects() == []
+    assert storage.load_homework() == {}
+    assert storage.load_grades() == {}
+    assert storage.load_hidden_subjects() == []
+    assert storage.load_homework_day('2025-03-03') is None
+    assert storage.load_schedule() == {
+        day: [{"start_date": "2024-01-01", "subjects": [''] * MAX_LESSONS}] for day in DAYS_OF_WEEK}
+
+
+def test_save_empty_schedule(storage):
+    storage.save_schedule({})
+    assert storage.load_schedule() == {}
+
+
+def test_roundtrip(storage):
+    schedule = {
+        'Понедельник': [{"start_date": "2024-09-01", "subjects": ['Алгебра'] + [''] * (MAX_LESSONS - 1)},
+                        {"start_date": "2025-01-13", "subjects": ['Физика'] + [''] * (MAX_LESSONS - 1)}],
+        'Вторник': [{"start_date": "2024-09-01", "subjects": [''] * MAX_LESSONS}],
+    }
+    homework = {'2025-03-03': {'Физика': 'стр. 5', 'Химия': ''}, '2025-04-01': {'Алгебра': '№ 12'}}
+    grades = {'Физика': [['5', '', '4'], [], ['3'], []], 'Химия': [[], [], [], []]}
+    storage.save_subjects(['Физика', 'Химия'])
+    storage.save_schedule(schedule)
+    storage.save_homework(homework)
+    storage.save_grades(grades)
+    storage.save_hidden_subjects(['Химия'])
+    assert storage.load_subjects() == ['Физика', 'Химия']
+    assert storage.load_schedule() == schedule
+    assert storage.load_homework() == homework
+    assert storage.load_grades() == grades
+    assert storage.load_hidden_subjects() == ['Химия']
+    assert storage.load_homework_day('2025-04-01') == {'Алгебра': '№ 12'}
+
+
+def test_legacy_schedule_format(storage):
+    storage.save_schedule({'Среда': ['Алгебра', 'Физика']})
+    assert storage.load_schedule()['Среда'] == [
+        {"start_date": "1970-01-01", "subjects": ['Алгебра', 'Физика'] + [''] * (MAX_LESSONS - 2)}]
+
+
+def test_point_edits(storage):
+    storage.set_grade('Физика', 1, 2, '5')
+    assert storage.load_grades() == {'Физика': [[], ['', '', '5'], [], []]}
+    storage.set_homework('2025-03-03', 'Физика', 'стр. 5')
+    storage.set_homework('2025-03-03', 'Химия', 'опыт')
+    assert storage.load_homework_day('2025-03-03') == {'Физика': 'стр. 5', 'Химия': 'опыт'}
+    storage.save_homework_day('2025-03-04', {'Алгебра': '№ 1'})
+    assert storage.delete_homework_day('2025-03-03')
+    assert not storage.delete_homework_day('2025-03-03')
+    assert storage.load_homework() == {'2025-03-04': {'Алгебра': '№ 1'}}
+
+
+def test_schedule_cell_starts_new_version(storage):
+    storage.save_schedule({'Понедельник': [{"start_date": "2024-09-01", "subjects": ['Алгебра', 'Физика']}]})
+    storage.set_schedule_cell('Понедельник', '2025-01-13', 1, 'Химия')
+    versions = sorted(storage.load_schedule()['Понедельник'], key=lambda v: v['start_date'])
+    assert versions[0]['subjects'][:2] == ['Алгебра', 'Физика']
+    assert versions[1]['start_date'] == '2025-01-13'
+    assert versions[1]['subjects'] == ['Алгебра', 'Химия'] + [''] * (MAX_LESSONS - 2)
+    assert storage.schedule_timeline().day_subjects('Понедельник', '2025-01-20')[1] == 'Химия'
+
+
+def test_apply_batch(storage):
+    storage.apply_batch([('add_subject', ('Физика',)), ('set_grade', ('Физика', 0, 0, '5')),
+                         ('set_homework', ('2025-03-03', 'Физика', 'стр. 5'))])
+    assert storage.load_subjects() == ['Физика']
+    assert storage.load_grades()['Физика'][0] == ['5']
+    with pytest.raises(BatchError) as error:
+        storage.apply_batch([('set_grade', ('Физика', 0, 1, '4')), ('add_subject', ('Физика',))])
+    assert error.value.index == 1
+    assert storage.load_grades()['Физика'][0] == ['5']
+    with pytest.raises(BatchError):
+        storage.apply_batch([('remove_subject', ('Химия',))])
+    storage.apply_batch([('remove_subject', ('Физика',)), ('delete_subject_grades', ('Физика',))])
+    assert storage.load_subjects() == [] and storage.load_grades() == {}
+
+
+def test_iterators(storage):
+    storage.save_homework({'2025-02-28': {'Физика': 'a'}, '2025-03-03': {'Физика': 'b', 'Химия': 'c'},
+                           '2025-03-10': {'Химия': 'd'}})
+    assert [date for date, _ in storage.iter_homework('2025-03-01', '2025-03-31')] == ['2025-03-03', '2025-03-10']
+    assert list(storage.iter_homework(subject='Химия', after='2025-03-03')) == [('2025-03-10', {'Химия': 'd'})]
+    storage.save_grades({'Физика': [['5', '', '4'], []]})
+    assert list(storage.iter_grade_records()) == [('Физика', 0, 0, '5'), ('Физика', 0, 2, '4')]
+
+
+def test_resource_version(storage):
+    before = storage.resource_version('grades')
+    assert storage.resource_version('grades') == before
+    storage.set_grade('Физика', 0, 0, '5')
+    assert storage.resource_version('grades') != before
+
+
+def test_journal_replay_skips_torn_record(tmp_path):
+    # Процесс падает сразу после правок: они есть только в mutations.log
+    script = ("import os, sys; from src.storage import Storage; s = Storage(root=sys.argv[1], journal_mode=True); "
+              "s.set_grade('Физика', 0, 1, '5'); s.set_homework('2025-03-03', 'Физика', 'стр. 5'); os._exit(1)")
+    subprocess.run([sys.executable, '-c', script, str(tmp_path)], cwd=ROOT, check=False)
+    assert not (tmp_path / 'grades.json').exists()
+    with open(tmp_path / 'mutations.log', 'a', encoding='utf-8') as f:
+        f.write('{"op": "set_gr')
+    storage = Storage(root=str(tmp_path), journal_mode=True)
+    assert storage.load_grades() == {'Физика': [['', '5'], [], [], []]}
+    assert storage.load_homework_day('2025-03-03') == {'Физика': 'стр. 5'}
+    # Воспроизведённый журнал сразу переносится в JSON
+    assert json.loads((tmp_path / 'grades.json').read_text(encoding='utf-8'))['Физика']['grade_0'] == ['', '5']
+    assert (tmp_path / 'mutations.log').stat().st_size == 0
+    storage.close()
+
+
+def test_journal_mode_refuses_shared_directory(tmp_path):
+    other = Storage(root=str(tmp_path))
+    with pytest.raises(RuntimeError):
+        Storage(root=str(tmp_path), journal_mode=True)
+    other.close()
+
+
+def test_queued_edits_rebased_on_outside_write(tmp_path):
+    # Отложенная правка не затирает то, что другой процесс записал до её сброса
+    delayed = Storage(root=str(tmp_path), write_delay=60)
+    delayed.set_grade('Физика', 0, 0, '5')
+    Storage(root=str(tmp_path)).set_grade('Химия', 0, 0, '4')
+    delayed.flush()
+    assert Storage(root=str(tmp_path)).load_grades() == {'Физика': [['5'], [], [], []], 'Химия': [['4'], [], [], []]}
+    delayed.close()
+
+
+def test_homework_shard_migration(tmp_path):
+    homework = {'2025-02-28': {'Физика': 'a'}, '2025-03-03': {'Химия': 'b'}, 'weird': {'x': 'y'}}
+    (tmp_path / 'homework.json').write_text(json.dumps(homework, ensure_ascii=False), encoding='utf-8')
+    storage = Storage(root=str(tmp_path))
+    assert storage.load_homework() == homework
+    assert sorted(os.listdir(tmp_path / 'homework')) == ['2025-02.json', '2025-03.json', 'other.json']
+    assert (tmp_path / 'homework.json.bak').exists() and not (tmp_path / 'homework.json').exists()
+    storage.close()
+
+
+def test_migrate_from_json(tmp_path):
+    source = Storage(root=str(tmp_path))
+    source.save_subjects(['Физика', 'Химия'])
+    source.set_schedule_cell('Вторник', '2024-09-01', 0, 'Физика')
+    source.save_homework({'2025-03-03': {'Физика': 'стр. 5'}})
+    source.save_grades({'Химия': [['5'], [], [], []]})
+    db_path = str(tmp_path / 'journal.db')
+    migrate_from_json(db_path, source)
+    target = SqliteStorage(db_path)
+    for resource in ('subjects', 'schedule', 'homework', 'grades'):
+        assert getattr(target, f'load_{resource}')() == getattr(source, f'load_{resource}')()
+    with pytest.raises(RuntimeError):
+        migrate_from_json(db_path, source)
+    target.close()
+    source.close()
+
+
+def test_batch_write_failure_leaves_files_untouched(tmp_path, monkeypatch):
+    storage = Storage(root=str(tmp_path))
+    storage.save_subjects(['Физика'])
+    write_temp = src.storage._write_temp
+    calls = []
+
+    def failing(path, data):
+        calls.append(path)
+        if len(calls) == 2:
+            raise OSError(28, 'No space left on device')
+        return write_temp(path, data)
+    monkeypatch.setattr(src.storage, '_write_temp', failing)
+    with pytest.raises(OSError):
+        storage.apply_batch([('add_subject', ('Химия',)), ('set_grade', ('Химия', 0, 0, '5'))])
+    monkeypatch.undo()
+    assert Storage(root=str(tmp_path)).load_subjects() == ['Физика']
+    assert storage.load_subjects() == ['Физика'] and storage.load_grades() == {}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+    storage.close()